@@ -1,12 +1,12 @@
 import os
-import numpy as np
-import cv2
-import pandas as pd
-import matplotlib.pyplot as plt
-from skimage import io, filters, morphology, measure, color, util
-from skimage.color import rgb2gray
-from scipy.spatial import ConvexHull
-from scipy import ndimage as ndi
+import sys
+
+try:
+    from organoid_pipeline import Pipeline
+except ImportError:
+    # Running from a checkout without `pip install .`: use the package next to this folder
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from organoid_pipeline import Pipeline
 
 # -------- Parameters --------
 min_cell_areas = [100, 50, 30,15,5]
@@ -14,6 +14,19 @@ high_intensity_fraction = 0.7
 distance_ratio_threshold = 0.7
 eccentricity_threshold = 0.4
 
+# -------- Batch Execution --------
+n_workers = None        # None = all cores, 1 = run serially
+chunk_size = 1
+threads_per_worker = 1  # BLAS/OpenMP threads per worker
+
+# -------- Output --------
+output_dir = "~/Desktop"  # Workbook, overlays and the per-image result store
+resume = True             # Skip images that already have results in the store
+
+# -------- Overlay Rendering --------
+render_overlays = True  # False = analysis only
+overlay_scale = 1.0     # Below 1 writes subsampled overlays for quick QC
+
 # -------- Define Image Files --------
 image_files = {
     "Sample_A": "path/to/your/images/Sample_A.tif",
@@ -22,148 +35,24 @@ image_files = {
     "Sample_D": "path/to/your/images/Sample_D.tif",
 }
 
-def process_image(image_name, image_path, save_dir):
-    img = io.imread(image_path)
-    img_gray = rgb2gray(img) if img.ndim == 3 else img.astype(float) / np.max(img)
-
-    thresh = filters.threshold_otsu(img_gray)
-    binary = img_gray > thresh
-    filled = ndi.binary_fill_holes(binary)
-
-    combined_labels = np.zeros_like(img_gray, dtype=int)
-    current_label = 1
-    cell_data_list = []
-    overlay_image = color.gray2rgb(util.img_as_ubyte(img_gray))
-
-    apical_in_count = 0
-    apical_out_count = 0
-
-    for min_cell_area in min_cell_areas:
-        cleaned = morphology.remove_small_objects(filled, min_size=min_cell_area)
-        if not np.any(cleaned):
-            continue
-
-        closed = morphology.closing(cleaned, morphology.disk(10))
-        dilated = morphology.binary_dilation(closed, morphology.disk(3))
-
-        labels = measure.label(dilated)
-        props = measure.regionprops(labels, intensity_image=img_gray)
-
-        for region in props:
-            if region.area < min_cell_area or region.eccentricity < eccentricity_threshold:
-                continue
-
-            cell_mask = labels == region.label
-            dist_transform = ndi.distance_transform_edt(cell_mask)
-            max_distance = np.max(dist_transform)
-            cell_intensity = img_gray[cell_mask]
-            intensity_threshold = high_intensity_fraction * np.max(cell_intensity)
-            high_intensity_mask = np.zeros_like(cell_mask, dtype=bool)
-            high_intensity_mask[cell_mask] = cell_intensity > intensity_threshold
-
-            mean_distance_high = np.mean(dist_transform[high_intensity_mask]) if np.sum(high_intensity_mask) > 0 else 0
-            distance_ratio = mean_distance_high / max_distance if max_distance > 0 else 0
-
-            if distance_ratio < distance_ratio_threshold:
-                cell_class = "Apical-out"
-                cell_color = (0, 0, 255)
-                apical_out_count += 1
-            else:
-                cell_class = "Apical-in"
-                cell_color = (255, 0, 0)
-                apical_in_count += 1
-
-            cell_data_list.append({
-                "Image Title": image_name,
-                "Cell ID": current_label,
-                "Min Cell Area Threshold": min_cell_area,
-                "Total Area": region.area,
-                "Classification": cell_class,
-                "Mean Intensity Ratio": distance_ratio
-            })
-
-            overlay_image[cell_mask] = cell_color
-            combined_labels[cell_mask] = current_label
-            current_label += 1
-
-    # Convex Hull and Area Calculation
-    convex_hull_summary = {}
-    cell_coords = np.column_stack(np.where(combined_labels > 0))
-    
-    if cell_coords.size > 0:
-        hull = ConvexHull(cell_coords)
-        convex_hull_area = hull.volume if hull.volume > 0 else 1e-6
-
-        apical_out_mask = np.all(overlay_image == [0, 0, 255], axis=-1)
-        apical_in_mask = np.all(overlay_image == [255, 0, 0], axis=-1)
-
-        apical_out_area = np.count_nonzero(apical_out_mask)
-        apical_in_area = np.count_nonzero(apical_in_mask)
-
-        apical_out_ratio = min(apical_out_area / convex_hull_area, 1.0)
-        apical_in_ratio = min(apical_in_area / convex_hull_area, 1.0)
-
-        convex_hull_summary = {
-            "Image Title": image_name,
-            "Convex Hull Area": convex_hull_area,
-            "Apical-out Count": apical_out_count,
-            "Apical-out Area": apical_out_area,
-            "Apical-out / Convex Hull Area": round(apical_out_ratio, 4),
-            "Apical-in Count": apical_in_count,
-            "Apical-in Area": apical_in_area,
-            "Apical-in / Convex Hull Area": round(apical_in_ratio, 4)
-        }
-
-        # Save PNG image to disk
-        fig, ax = plt.subplots(figsize=(8, 8))
-        ax.imshow(overlay_image)
-        ax.set_title(f"{image_name}: Red = Apical-in, Blue = Apical-out, Yellow = Convex Hull")
-        ax.axis("off")
-        hull_polygon = np.append(cell_coords[hull.vertices], [cell_coords[hull.vertices][0]], axis=0)
-        ax.plot(hull_polygon[:, 1], hull_polygon[:, 0], color='yellow', linewidth=2)
-
-        save_path = os.path.join(save_dir, f"{image_name}_overlay.png")
-        plt.savefig(save_path, bbox_inches='tight')
-        plt.close()
-
-    return cell_data_list, convex_hull_summary
+# Feature 1 is the pipeline's "classify" mode: every cell is recorded as Apical-in or Apical-out
+pipeline = Pipeline(
+    mode="classify",
+    min_cell_areas=min_cell_areas,
+    high_intensity_fraction=high_intensity_fraction,
+    distance_ratio_threshold=distance_ratio_threshold,
+    eccentricity_threshold=eccentricity_threshold,
+    workers=n_workers,
+    chunk_size=chunk_size,
+    threads_per_worker=threads_per_worker,
+    output_dir=output_dir,
+    resume=resume,
+    render_overlays=render_overlays,
+    overlay_scale=overlay_scale
+)
 
 def main():
-    all_cell_data = []
-    convex_hull_list = []
-
-    desktop_path = os.path.expanduser("~/Desktop")
-    output_excel_path = os.path.join(desktop_path, "updated_cell_analysis.xlsx")
-
-    for image_name, image_path in image_files.items():
-        print(f"Processing {image_name} ...")
-        cell_data, convex_summary = process_image(image_name, image_path, desktop_path)
-        all_cell_data.extend(cell_data)
-        convex_hull_list.append(convex_summary)
-
-    # Export to Excel
-    df_cells = pd.DataFrame(all_cell_data)
-    df_convex = pd.DataFrame(convex_hull_list)
-
-    # Create summary statistics
-    total_apical_in = df_convex["Apical-in Count"].sum()
-    total_apical_out = df_convex["Apical-out Count"].sum()
-    mean_in_ratio = df_convex["Apical-in / Convex Hull Area"].mean()
-    mean_out_ratio = df_convex["Apical-out / Convex Hull Area"].mean()
-
-    df_summary = pd.DataFrame([{
-        "Total Apical-in": total_apical_in,
-        "Total Apical-out": total_apical_out,
-        "Mean Apical-in / Hull": round(mean_in_ratio, 4),
-        "Mean Apical-out / Hull": round(mean_out_ratio, 4)
-    }])
-
-    with pd.ExcelWriter(output_excel_path) as writer:
-        df_cells.to_excel(writer, sheet_name="Cell Data", index=False)
-        df_convex.to_excel(writer, sheet_name="Convex Hull Summary", index=False)
-        df_summary.to_excel(writer, sheet_name="Summary", index=False)
-
-    print(f"Analysis complete. Results and images saved to: {desktop_path}")
+    pipeline.run(image_files)
 
 if __name__ == "__main__":
     main()
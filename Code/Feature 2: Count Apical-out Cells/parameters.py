@@ -3,6 +3,26 @@ min_cell_areas = [100, 50, 30, 15, 10, 5, 3]  # Try these thresholds in order
 high_intensity_fraction = 0.8    # Fraction of maximum intensity to define high-intensity pixels
 distance_ratio_threshold = 0.4   # Threshold for the distance ratio to classify cells
 eccentricity_threshold = 0.4     # Filter out nearly circular objects (0 = perfect circle)
+feature_mode = "per_region"      # "per_region" (bounding-box crop per cell) or "batched" (one EDT for the whole label image)
+morphology_backend = "skimage"   # "skimage" (reference), "decomposed", "opencv" or "edt"; compare with morphology_backends.py
+
+# Segmentation Cache
+cache_dir = None                   # Directory for cached Otsu/segmentation results (None disables the cache)
+cache_max_bytes = 2 * 1024 ** 3    # Least recently used entries are evicted beyond this size
+
+# Batch Execution
+n_workers = None        # Worker processes for the batch (None = all cores, 1 = run serially)
+chunk_size = 1          # Images handed to a worker at a time
+threads_per_worker = 1  # BLAS/OpenMP threads allowed in each worker
+
+# Output
+output_dir = "~/Desktop"  # Workbook, overlays and the per-image result store are written here
+resume = True             # Skip images that already have results in the store (False = reprocess everything)
+profile_log = "profile.jsonl"  # Per-image stage timings, peak RSS and counters, appended in output_dir (None disables)
+
+# Overlay Rendering
+render_overlays = True  # Write <image>_overlay.png next to the results (False = analysis only)
+overlay_scale = 1.0     # Below 1 writes subsampled overlays for quick QC
 
 # Image Files
 image_files = {
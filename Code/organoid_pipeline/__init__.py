@@ -0,0 +1,22 @@
+"""
+Neuroepithelial organoid analysis pipeline: classify cells as Apical-in/Apical-out or count Apical-out cells.
+
+    from organoid_pipeline import Pipeline
+    Pipeline(mode="classify", output_dir="results").run({"Sample_A": "Sample_A.tif"})
+
+`Pipeline` and `load_config` are imported on first use, so importing the package (and the
+command-line interface) does not load scipy, scikit-image or pandas.
+"""
+
+__version__ = "0.1.0"
+__all__ = ["Pipeline", "load_config"]
+
+
+def __getattr__(name):
+    if name == "Pipeline":
+        from .pipeline import Pipeline
+        return Pipeline
+    if name == "load_config":
+        from .config import load_config
+        return load_config
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
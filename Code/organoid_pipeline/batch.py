@@ -0,0 +1,208 @@
+import os
+import signal
+import traceback
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from .profiling import profile_image, stage
+
+# Error recorded for the images of a worker that died without raising (killed, out of memory, segfault)
+WORKER_DIED = ("Worker process died while processing this image (killed, out of memory or crashed); "
+               "the pool was restarted for the remaining images.")
+
+# Environment variables read by the BLAS/OpenMP runtimes when a worker imports numpy/scipy
+THREAD_LIMIT_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+def _limit_threads(threads_per_worker):
+    # Runtimes already loaded in the worker (e.g. inherited through fork) are capped here
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads_per_worker)
+    except ImportError:
+        pass
+    try:
+        import cv2
+        cv2.setNumThreads(threads_per_worker)
+    except ImportError:
+        pass
+
+
+def run_task(task):
+    """
+    Process one image task from `image_task`, as every step of `iter_batch` does.
+
+    Parameters:
+        task (tuple): Task from `image_task`.
+
+    Returns:
+        result (tuple): `(image_name, image_path, result, error, profile)`, as yielded by `iter_batch`.
+    """
+    process_image, image_name, image_path, extra_args, overlay_dir, overlay_scale = task
+    # Stage timings and counters are recorded for failed images too, up to the failing stage
+    with profile_image(image_name) as profile:
+        try:
+            cell_data, convex_summary, overlay = process_image(image_name, image_path, *extra_args)
+            # Render in the worker and return only the tables, never the label image
+            if overlay_dir is not None and overlay["hull_vertices"] is not None:
+                # Imported here so workers that never render skip skimage.io
+                from .render import save_overlay
+                with stage("render"):
+                    save_overlay(os.path.join(overlay_dir, f"{image_name}_overlay.png"), overlay, overlay_scale)
+            del overlay
+            # Peak RSS of the worker while it held the image (memmaps and native buffers included),
+            # to size nodes and worker counts
+            profile.sample()
+            peak_rss_mb = profile.peak_rss_mb
+            convex_summary = {"Image Title": image_name, **convex_summary,
+                              "Peak Memory (MB)": round(peak_rss_mb, 1) if peak_rss_mb is not None else None}
+            result, error = (cell_data, convex_summary), None
+        except Exception:
+            result, error = None, traceback.format_exc()
+    return image_name, image_path, result, error, profile.record()
+
+
+def _run_chunk(tasks):
+    return [run_task(task) for task in tasks]
+
+
+def _run_alone(tasks, threads_per_worker):
+    # Images caught in a broken pool, each rerun in a fresh single worker; one that kills it again fails
+    results = []
+    for task in tasks:
+        with worker_pool(1, threads_per_worker) as executor:
+            try:
+                results.append(executor.submit(run_task, task).result())
+            except BrokenProcessPool:
+                _, image_name, image_path, *_ = task
+                results.append((image_name, image_path, None, WORKER_DIED,
+                                {"Image Title": image_name, "Total (s)": None, "Peak RSS (MB)": None, "stages": {},
+                                 "counters": {}}))
+    return results
+
+
+def image_task(process_image, image_name, image_path, extra_args=(), overlay_dir=None, overlay_scale=1.0):
+    """
+    Package one image for `run_task`, e.g. to submit it to a `worker_pool` executor.
+
+    Parameters:
+        process_image (callable): Module-level function, see `iter_batch`.
+        image_name (str): Title of the image.
+        image_path (str): Path to the image file.
+        extra_args (tuple): Additional positional arguments passed to `process_image`.
+        overlay_dir (str): Directory for the `<image_name>_overlay.png` overlay (None skips rendering).
+        overlay_scale (float): Scale of the rendered overlay.
+
+    Returns:
+        task (tuple): Picklable task.
+    """
+    return process_image, image_name, image_path, tuple(extra_args), overlay_dir, overlay_scale
+
+
+def _init_worker(threads_per_worker, ignore_interrupt):
+    _limit_threads(threads_per_worker)
+    if ignore_interrupt:
+        # Ctrl+C reaches the whole process group; let the parent decide what happens to running images
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+@contextmanager
+def worker_pool(workers, threads_per_worker=1, ignore_interrupt=False):
+    """
+    Process pool whose workers cap their BLAS/OpenMP threads at `threads_per_worker`.
+
+    Parameters:
+        workers (int): Number of worker processes.
+        threads_per_worker (int): Cap on BLAS/OpenMP threads in each worker.
+        ignore_interrupt (bool): Workers ignore Ctrl+C, so running images finish when the parent stops.
+
+    Yields:
+        executor (ProcessPoolExecutor): The running pool, shut down on exit.
+    """
+    # Set the caps before the pool starts so freshly spawned workers inherit them
+    previous = {name: os.environ.get(name) for name in THREAD_LIMIT_VARIABLES}
+    for name in THREAD_LIMIT_VARIABLES:
+        os.environ[name] = str(threads_per_worker)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(threads_per_worker, ignore_interrupt)) as executor:
+            yield executor
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def iter_batch(process_image, image_files, workers=None, chunk_size=1, threads_per_worker=1, extra_args=(),
+               overlay_dir=None, overlay_scale=1.0):
+    """
+    Run `process_image` over a batch of images with a process pool, yielding each result as it is ready.
+
+    Results come back in the order of `image_files`, whatever order the workers finish in, so a
+    caller can write every image out before the next one arrives instead of holding the batch.
+    An image that raises is yielded with its traceback and the rest of the batch continues. When a
+    worker dies outright (e.g. killed for running out of memory), the pool is restarted for the rest
+    of the batch and the images it lost are rerun one at a time; an image that kills its worker
+    again is yielded as failed.
+
+    Parameters:
+        process_image (callable): Module-level function called as `process_image(image_name, image_path, *extra_args)`
+            and returning `(cell_data_list, convex_hull_summary, overlay)`.
+        image_files (dict): Mapping of image title to image path.
+        workers (int): Number of worker processes (None uses every core, 1 runs in the current process).
+        chunk_size (int): Number of images sent to a worker at a time.
+        threads_per_worker (int): Cap on BLAS/OpenMP threads in each worker to avoid oversubscribing cores.
+        extra_args (tuple): Additional positional arguments passed to `process_image`.
+        overlay_dir (str): Directory for the `<image_name>_overlay.png` overlays (None skips rendering).
+        overlay_scale (float): Scale of the rendered overlays; values below 1 write smaller QC previews.
+
+    Yields:
+        image_name (str): Title of the image.
+        image_path (str): Path to the image file.
+        result (tuple): `(cell_data_list, convex_hull_summary)`, or None when the image failed.
+        error (str): Traceback of the failure, or None on success.
+        profile (dict): Stage timings, peak RSS and counters of the image (see `profiling.ImageProfile.record`).
+    """
+    tasks = [image_task(process_image, image_name, image_path, extra_args, overlay_dir, overlay_scale)
+             for image_name, image_path in image_files.items()]
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, max(len(tasks), 1))
+
+    if workers == 1:
+        yield from map(run_task, tasks)
+        return
+
+    chunk_size = max(chunk_size, 1)
+    chunks = [tasks[start:start + chunk_size] for start in range(0, len(tasks), chunk_size)]
+    finished = {}
+    next_chunk = next_result = 0
+    while next_result < len(chunks):
+        # At most one chunk per worker is submitted, so a dead worker takes few other images with it
+        with worker_pool(workers, threads_per_worker) as executor:
+            running = {}
+            try:
+                while True:
+                    while next_result in finished:
+                        yield from finished.pop(next_result)
+                        next_result += 1
+                    if next_result == len(chunks):
+                        break
+                    while next_chunk < len(chunks) and len(running) < workers:
+                        running[executor.submit(_run_chunk, chunks[next_chunk])] = next_chunk
+                        next_chunk += 1
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        finished[running[future]] = future.result()
+                        del running[future]
+            except BrokenProcessPool:
+                for future, index in running.items():
+                    lost = not future.done() or future.cancelled() or future.exception() is not None
+                    finished[index] = _run_alone(chunks[index], threads_per_worker) if lost else future.result()
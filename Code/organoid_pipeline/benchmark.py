@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import hashlib
+import platform
+import tempfile
+import numpy as np
+import pandas as pd
+import scipy
+import skimage
+from .pipeline import Pipeline
+from .profiling import profile_image, stage
+from .render import save_overlay
+from .results_store import write_image_results, export_workbook
+from .synthetic import write_organoid, max_cells
+
+# "classify" is the Feature 1 (try2.py) configuration, "count" and "count_batched" the Feature 2 one
+PIPELINES = {
+    "classify": {"mode": "classify"},
+    "count": {"mode": "count"},
+    "count_batched": {"mode": "count", "feature_mode": "batched"},
+}
+STAGES = ("load", "cache", "otsu", "fill", "segmentation", "morphology", "labeling", "features", "hull", "render",
+          "export")
+
+
+def _digest(cell_data):
+    # Fingerprint of the cell table, to tell a faster pipeline from one that changed its results
+    df = pd.DataFrame(cell_data).drop(columns="Image Title", errors="ignore").round(6)
+    return hashlib.sha256(df.to_csv(index=False).encode()).hexdigest()[:16]
+
+
+def _run_pipeline(name, image_path, work_dir):
+    # Process, render and export one image, timed by the pipeline's own profiling hooks
+    pipeline = Pipeline(**PIPELINES[name], cache_dir=None)
+    with profile_image("synthetic") as profile:
+        cell_data, convex_summary, overlay = pipeline.process_image("synthetic", image_path)
+        with stage("render"):
+            if overlay["hull_vertices"] is not None:
+                save_overlay(os.path.join(work_dir, f"{name}_overlay.png"), overlay)
+        del overlay
+        with stage("export"):
+            store_dir = os.path.join(work_dir, f"{name}_results")
+            write_image_results(store_dir, "synthetic", cell_data, convex_summary)
+            export_workbook(store_dir, ["synthetic"], os.path.join(work_dir, f"{name}.xlsx"))
+
+    if pipeline.mode == "classify":
+        counts = {name: int(convex_summary.get(name, 0)) for name in ("Apical-out Count", "Apical-in Count")}
+    else:
+        counts = {"Apical-out Count": len(cell_data)}
+    return cell_data, counts, profile.record()
+
+
+def run_case(size, n_cells, apical_out_fraction=0.5, seed=0, repeats=3, pipelines=tuple(PIPELINES)):
+    """
+    Benchmark the pipelines on one synthetic organoid.
+
+    Each pipeline runs `repeats` times and the fastest run is reported, stage by stage.
+
+    Parameters:
+        size (int): Image width and height in pixels.
+        n_cells (int): Number of synthetic cells.
+        apical_out_fraction (float): Fraction of cells drawn as Apical-out.
+        seed (int): Seed of the synthetic image.
+        repeats (int): Number of timed runs per pipeline.
+        pipelines (tuple): Names from `PIPELINES` to run.
+
+    Returns:
+        case (dict): Case settings, ground-truth counts and, per pipeline, "total" and per-stage
+            seconds, call counts, peak RSS, predicted counts and a digest of the cell table.
+    """
+    case = {"size": size, "n_cells": n_cells, "apical_out_fraction": apical_out_fraction, "seed": seed,
+            "results": {}}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        image_path = os.path.join(work_dir, "synthetic.tif")
+        truth = write_organoid(image_path, size, n_cells, apical_out_fraction, seed)
+        case["truth"] = {name: truth[name] for name in ("Apical-out Count", "Apical-in Count")}
+
+        for pipeline in pipelines:
+            best = None
+            for _ in range(repeats):
+                cell_data, counts, record = _run_pipeline(pipeline, image_path, work_dir)
+                if best is None or record["Total (s)"] < best["total"]:
+                    stages = record["stages"]
+                    best = {
+                        "total": record["Total (s)"],
+                        "stages": {name: stages[name]["seconds"] if name in stages else 0.0 for name in STAGES},
+                        "calls": {name: stages[name]["calls"] if name in stages else 0 for name in STAGES},
+                        "peak_rss_mb": record["Peak RSS (MB)"],
+                        "counts": counts,
+                        "digest": _digest(cell_data)
+                    }
+            case["results"][pipeline] = best
+            print(f"{size}x{size}, {n_cells} cells - {pipeline}: {best['total']:.3f} s")
+    return case
+
+
+def run_benchmark(sizes=(512, 1024, 2048), n_cells=None, apical_out_fraction=0.5, seed=0, repeats=3,
+                  pipelines=tuple(PIPELINES)):
+    """
+    Benchmark the pipelines on synthetic organoids of several sizes. Runs offline on the CPU.
+
+    Parameters:
+        sizes (list): Image sizes in pixels (e.g. 512 up to 8192).
+        n_cells (int): Cells per image (None uses half of what fits, see `synthetic.max_cells`).
+        apical_out_fraction (float): Fraction of cells drawn as Apical-out.
+        seed (int): Seed of the synthetic images.
+        repeats (int): Number of timed runs per pipeline and size.
+        pipelines (tuple): Names from `PIPELINES` to run.
+
+    Returns:
+        report (dict): "environment" (library versions and CPU count) and one entry per size in "cases".
+    """
+    cases = [run_case(size, n_cells if n_cells is not None else max_cells(size) // 2, apical_out_fraction, seed,
+                      repeats, tuple(pipelines)) for size in sizes]
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "scikit-image": skimage.__version__
+        },
+        "cases": cases
+    }
+
+
+def compare_reports(report, baseline, tolerance=0.1):
+    """
+    Compare stage timings and results of a report against a stored baseline report.
+
+    Parameters:
+        report (dict): Output of `run_benchmark`.
+        baseline (dict): Earlier output of `run_benchmark`.
+        tolerance (float): Relative slowdown above which a stage is flagged as a regression.
+
+    Returns:
+        df_comparison (DataFrame): One row per case, pipeline and stage present in both reports.
+    """
+    def case_key(case):
+        return case["size"], case["n_cells"], case["apical_out_fraction"], case["seed"]
+
+    baseline_cases = {case_key(case): case for case in baseline["cases"]}
+    rows = []
+    for case in report["cases"]:
+        baseline_case = baseline_cases.get(case_key(case))
+        if baseline_case is None:
+            continue
+        for pipeline, result in case["results"].items():
+            baseline_result = baseline_case["results"].get(pipeline)
+            if baseline_result is None:
+                continue
+            for stage in ("total",) + STAGES:
+                current = result["total"] if stage == "total" else result["stages"].get(stage, 0.0)
+                previous = baseline_result["total"] if stage == "total" else baseline_result["stages"].get(stage, 0.0)
+                ratio = current / previous if previous > 0 else np.nan
+                rows.append({
+                    "Size": case["size"],
+                    "Cells": case["n_cells"],
+                    "Pipeline": pipeline,
+                    "Stage": stage,
+                    "Baseline (s)": round(previous, 4),
+                    "Current (s)": round(current, 4),
+                    "Current / Baseline": round(ratio, 3),
+                    # Stages that take milliseconds are too noisy to flag on their ratio alone
+                    "Regression": bool(ratio > 1 + tolerance and (stage == "total" or current - previous > 0.01)),
+                    "Results Changed": result["digest"] != baseline_result["digest"]
+                })
+    return pd.DataFrame(rows)
+
+
+def run_from_args(args):
+    """
+    Run the benchmark, write the JSON report and print the stage tables and baseline comparison.
+
+    Parameters:
+        args (Namespace): Options of the `organoid-pipeline benchmark` subcommand.
+    """
+    report = run_benchmark(args.sizes, args.cells, args.apical_out_fraction, args.seed, args.repeats, args.pipelines)
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Benchmark report saved to: {args.output}")
+
+    for case in report["cases"]:
+        df_stages = pd.DataFrame({pipeline: result["stages"] for pipeline, result in case["results"].items()})
+        df_stages.loc["total"] = [result["total"] for result in case["results"].values()]
+        print(f"\n{case['size']}x{case['size']}, {case['n_cells']} cells (truth: {case['truth']})")
+        print(df_stages.round(4).to_string())
+        for pipeline, result in case["results"].items():
+            print(f"  {pipeline} counts: {result['counts']}")
+
+    if args.baseline is not None:
+        if os.path.exists(args.baseline) and not args.update_baseline:
+            with open(args.baseline) as handle:
+                baseline = json.load(handle)
+            df_comparison = compare_reports(report, baseline, args.tolerance)
+            print("\nComparison against baseline:")
+            print(df_comparison.to_string(index=False))
+            if df_comparison["Results Changed"].any():
+                print("Warning: results differ from the baseline.")
+            if df_comparison["Regression"].any():
+                print("Warning: stages slower than the baseline by more than the tolerance.")
+        else:
+            with open(args.baseline, "w") as handle:
+                json.dump(report, handle, indent=2)
+            print(f"Baseline saved to: {args.baseline}")
+
+
+def main(argv=None):
+    from .cli import main as cli_main
+
+    cli_main(["benchmark"] + list(sys.argv[1:] if argv is None else argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
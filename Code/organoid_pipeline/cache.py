@@ -0,0 +1,129 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+# Bump when segmentation changes in a way that invalidates stored results
+CACHE_VERSION = 1
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    Hash the content of a file, so renamed or copied images still hit the cache.
+
+    Parameters:
+        path (str): Path to the file.
+        chunk_size (int): Number of bytes read at a time.
+
+    Returns:
+        digest (str): SHA-256 hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(image_path, **segmentation_parameters):
+    """
+    Build the cache key of an image from its content and the parameters segmentation depends on.
+
+    Parameters:
+        image_path (str): Path to the image file.
+        **segmentation_parameters: Values that change the segmentation (e.g. min_cell_areas, morphology_backend).
+
+    Returns:
+        key (str): Hex digest identifying the cached entry.
+    """
+    payload = json.dumps({
+        "version": CACHE_VERSION,
+        "image": file_digest(image_path),
+        "parameters": segmentation_parameters
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _entry_path(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.npz")
+
+
+def load_segmentation(cache_dir, key):
+    """
+    Load cached segmentation intermediates and mark the entry as recently used.
+
+    Parameters:
+        cache_dir (str): Cache directory.
+        key (str): Key from `cache_key`.
+
+    Returns:
+        arrays (dict): Stored arrays by name, or None on a cache miss.
+    """
+    path = _entry_path(cache_dir, key)
+    try:
+        with np.load(path) as entry:
+            arrays = {name: entry[name] for name in entry.files}
+    except (FileNotFoundError, OSError, ValueError):
+        return None
+    # The modification time doubles as the last-access time for LRU eviction
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return arrays
+
+
+def save_segmentation(cache_dir, key, arrays, max_bytes=None):
+    """
+    Store segmentation intermediates as a compressed .npz and evict old entries past the size cap.
+
+    Parameters:
+        cache_dir (str): Cache directory (created if missing).
+        key (str): Key from `cache_key`.
+        arrays (dict): Arrays to store by name (e.g. "thresh", "filled", "labels", "region_thresholds").
+        max_bytes (int): Size cap of the cache directory; least recently used entries are removed first (None = no cap).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file first so concurrent workers never read a partial entry
+    handle, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as temp_file:
+            np.savez_compressed(temp_file, **arrays)
+        os.replace(temp_path, _entry_path(cache_dir, key))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    if max_bytes is not None:
+        evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir, max_bytes):
+    """
+    Remove least recently used entries until the cache fits within `max_bytes`.
+
+    Parameters:
+        cache_dir (str): Cache directory.
+        max_bytes (int): Size cap in bytes.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".npz"):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
@@ -0,0 +1,275 @@
+import os
+import sys
+import argparse
+
+
+# Only argparse is imported at startup; each subcommand imports the pipeline modules it needs.
+# Settings that the subcommands accept on the command line (see config.DEFAULTS)
+CONFIG_OPTIONS = ("mode", "min_cell_areas", "high_intensity_fraction", "distance_ratio_threshold",
+                  "eccentricity_threshold", "projection", "morphology_backend", "cache_dir", "workers")
+THRESHOLD_OPTIONS = CONFIG_OPTIONS + ("output_dir", "control_images", "histogram_bins")
+RUN_OPTIONS = CONFIG_OPTIONS + ("feature_mode", "output_dir", "overlay_scale", "chunk_size", "threads_per_worker",
+                                "render_overlays", "resume", "tile_size", "tile_workers", "otsu_source",
+                                "control_images", "otsu_threshold", "histogram_bins")
+WATCH_OPTIONS = tuple(name for name in RUN_OPTIONS if name != "resume") + ("poll_interval",)
+PREVIEW_OPTIONS = RUN_OPTIONS + ("preview_factor", "preview_min_foreground", "preview_min_contrast", "preview_margin")
+# Names of benchmark.PIPELINES, listed here so that parsing does not import the pipeline
+BENCHMARK_PIPELINES = ("classify", "count", "count_batched")
+
+
+def _image_files(paths):
+    # Images given on the command line are titled by their file name without extension
+    return {os.path.splitext(os.path.basename(path))[0]: path for path in paths}
+
+
+def _settings(args, names):
+    # Only options that were given override the config file and the defaults
+    return {name: getattr(args, name) for name in names if getattr(args, name) is not None}
+
+
+def _add_config_arguments(parser, images=True):
+    if images:
+        parser.add_argument("images", nargs="*", help="Image files (default: image_files from --config).")
+    parser.add_argument("--config", default=None, help="JSON or TOML file with pipeline settings.")
+    parser.add_argument("--mode", choices=["classify", "count"], default=None)
+    parser.add_argument("--min-cell-areas", dest="min_cell_areas", type=int, nargs="+", default=None)
+    parser.add_argument("--high-intensity-fraction", dest="high_intensity_fraction", type=float, default=None)
+    parser.add_argument("--distance-ratio-threshold", dest="distance_ratio_threshold", type=float, default=None)
+    parser.add_argument("--eccentricity-threshold", dest="eccentricity_threshold", type=float, default=None)
+    parser.add_argument("--projection", choices=["max", "mean"], default=None)
+    parser.add_argument("--morphology-backend", dest="morphology_backend",
+                        choices=["skimage", "decomposed", "opencv", "edt"], default=None)
+    parser.add_argument("--cache-dir", dest="cache_dir", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+
+
+def _add_run_arguments(parser):
+    parser.add_argument("--feature-mode", dest="feature_mode", choices=["per_region", "batched"], default=None)
+    parser.add_argument("--output-dir", dest="output_dir", default=None)
+    parser.add_argument("--chunk-size", dest="chunk_size", type=int, default=None)
+    parser.add_argument("--threads-per-worker", dest="threads_per_worker", type=int, default=None)
+    parser.add_argument("--tile-size", dest="tile_size", type=int, default=None,
+                        help="Process each image in tiles of this size (whole-well and stitched mosaics).")
+    parser.add_argument("--tile-workers", dest="tile_workers", type=int, default=None)
+    parser.add_argument("--overlay-scale", dest="overlay_scale", type=float, default=None)
+    parser.add_argument("--no-overlays", dest="render_overlays", action="store_const", const=False, default=None)
+    parser.add_argument("--otsu-source", dest="otsu_source", choices=["image", "plate"], default=None,
+                        help="Threshold each image with its own Otsu threshold or with one for the whole plate.")
+    parser.add_argument("--otsu-threshold", dest="otsu_threshold", type=float, default=None,
+                        help="Fixed threshold for every image, e.g. a plate threshold from `thresholds`.")
+    _add_histogram_arguments(parser)
+
+
+def _add_histogram_arguments(parser):
+    parser.add_argument("--control-images", dest="control_images", nargs="+", default=None,
+                        help="Image titles pooled for the plate threshold (default: every image).")
+    parser.add_argument("--histogram-bins", dest="histogram_bins", type=int, default=None)
+
+
+def _load_config(args, names):
+    from .config import load_config
+
+    settings = _settings(args, names)
+    if args.images:
+        settings["image_files"] = _image_files(args.images)
+    return load_config(args.config, **settings)
+
+
+def run(args):
+    from .pipeline import Pipeline
+
+    config = _load_config(args, RUN_OPTIONS)
+    if not config["image_files"]:
+        sys.exit("No images given: pass image paths or a --config file with image_files.")
+    Pipeline(config).run()
+
+
+def watch(args):
+    from .pipeline import Pipeline
+
+    if not os.path.isdir(args.watch_dir):
+        sys.exit(f"Not a folder: {args.watch_dir}")
+    Pipeline(_load_config(args, WATCH_OPTIONS)).watch(args.watch_dir, once=args.once)
+
+
+def preview(args):
+    from .pipeline import Pipeline
+
+    pipeline = Pipeline(_load_config(args, PREVIEW_OPTIONS))
+    image_files = pipeline.config["image_files"]
+    if not image_files:
+        sys.exit("No images given: pass image paths or a --config file with image_files.")
+    # The flagged images are run with the threshold of the whole plate
+    pipeline = pipeline.with_plate_threshold()
+    df_preview = pipeline.preview()
+    df_preview.to_csv(args.output, index=False)
+    print(df_preview.to_string(index=False))
+
+    flagged = df_preview.loc[df_preview["Needs Full Resolution"], "Image Title"].tolist()
+    print(f"{len(flagged)} of {len(df_preview)} images need full-resolution analysis. Preview saved to: {args.output}")
+    if args.run_flagged and flagged:
+        pipeline.run({image_name: image_files[image_name] for image_name in flagged})
+
+
+def thresholds(args):
+    from .pipeline import Pipeline
+
+    pipeline = Pipeline(_load_config(args, THRESHOLD_OPTIONS))
+    if not pipeline.config["image_files"]:
+        sys.exit("No images given: pass image paths or a --config file with image_files.")
+    df_thresholds, plate_threshold = pipeline.plate_thresholds()
+    df_thresholds.to_csv(args.output, index=False)
+    print(df_thresholds.to_string(index=False))
+    print(f"Plate Otsu threshold: {plate_threshold:.4f} (use --otsu-threshold {plate_threshold:.6g}). "
+          f"Thresholds saved to: {args.output}")
+
+
+def sweep(args):
+    import numpy as np
+    from .sweep import run_sweep
+
+    config = _load_config(args, CONFIG_OPTIONS)
+    df_sweep = run_sweep(
+        config["image_files"],
+        high_intensity_fractions=np.round(np.linspace(0.5, 0.95, 10), 3),
+        distance_ratio_thresholds=np.round(np.linspace(0.1, 0.9, 10), 3),
+        eccentricity_thresholds=np.round(np.linspace(0.0, 0.8, 5), 3),
+        workers=config["workers"] or os.cpu_count() or 1,
+        config=config
+    )
+    df_sweep.to_csv(args.output, index=False)
+    print(f"Sweep complete. Results saved to: {args.output}")
+
+
+def backends(args):
+    import pandas as pd
+    from .image_loader import load_grayscale
+    from .segmentation import otsu_threshold, remove_small_cells
+    from .morphology_backends import compare_backends, pick_backend
+
+    config = _load_config(args, CONFIG_OPTIONS)
+    rows = []
+    for image_name, image_path in config["image_files"].items():
+        filled, _ = otsu_threshold(load_grayscale(image_path, config["projection"]), config["otsu_threshold"],
+                                   config["histogram_bins"])
+        # Backends are compared on the cleaned masks the pipeline closes and dilates
+        for min_cell_area in sorted(config["min_cell_areas"]):
+            cleaned = remove_small_cells(filled, min_cell_area)
+            for row in compare_backends(cleaned, config["closing_radius"], config["dilation_radius"]):
+                rows.append({"Image Title": image_name, "Min Cell Area": min_cell_area, **row})
+
+    print(pd.DataFrame(rows).to_string(index=False))
+    print(f"Fastest backend within tolerance: {pick_backend(rows)}")
+
+
+def kernels(args):
+    import pandas as pd
+    from .kernels import HAVE_NUMBA, compare_kernels
+
+    if not HAVE_NUMBA:
+        print("numba is not installed; only the NumPy kernels are timed (pip install numba).")
+    report = compare_kernels(args.cells, args.max_area, args.high_intensity_fraction, args.repeats, args.seed)
+    print(pd.DataFrame(report).to_string(index=False))
+
+
+def benchmark(args):
+    from .benchmark import run_from_args
+
+    run_from_args(args)
+
+
+def _add_benchmark_arguments(parser):
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 2048], help="Image sizes in pixels.")
+    parser.add_argument("--cells", type=int, default=None, help="Cells per image (default: half of what fits).")
+    parser.add_argument("--apical-out-fraction", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--pipelines", nargs="+", choices=BENCHMARK_PIPELINES, default=list(BENCHMARK_PIPELINES))
+    parser.add_argument("--output", default="benchmark_report.json", help="Path of the JSON report.")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare against.")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this report to --baseline as well.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative slowdown flagged as a regression.")
+
+
+def build_parser():
+    """
+    Build the `organoid-pipeline` argument parser.
+
+    Returns:
+        parser (ArgumentParser): Parser with the run, watch, preview, thresholds, sweep, backends, kernels and
+            benchmark subcommands.
+    """
+    parser = argparse.ArgumentParser(prog="organoid-pipeline",
+                                     description="Segment organoid images and classify or count apical-out cells.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Analyse images and write the Excel workbook.")
+    _add_config_arguments(run_parser)
+    _add_run_arguments(run_parser)
+    run_parser.add_argument("--no-resume", dest="resume", action="store_const", const=False, default=None)
+    run_parser.set_defaults(handler=run)
+
+    watch_parser = subparsers.add_parser("watch", help="Process new images as they appear in a folder.")
+    watch_parser.add_argument("watch_dir", help="Folder the microscope writes images to.")
+    _add_config_arguments(watch_parser, images=False)
+    _add_run_arguments(watch_parser)
+    watch_parser.add_argument("--poll-interval", dest="poll_interval", type=float, default=None,
+                              help="Seconds between scans of the folder.")
+    watch_parser.add_argument("--once", action="store_true", help="Process the images present now and exit.")
+    watch_parser.set_defaults(handler=watch, images=None)
+
+    preview_parser = subparsers.add_parser("preview", help="Fast approximate counts on downsampled images (triage).")
+    _add_config_arguments(preview_parser)
+    _add_run_arguments(preview_parser)
+    preview_parser.add_argument("--preview-factor", dest="preview_factor", type=int, default=None,
+                                help="Downsampling per axis, a power of two.")
+    preview_parser.add_argument("--preview-min-foreground", dest="preview_min_foreground", type=float, default=None,
+                                help="Skip images whose Otsu foreground fraction is below this.")
+    preview_parser.add_argument("--preview-min-contrast", dest="preview_min_contrast", type=float, default=None,
+                                help="Skip images whose Otsu classes are fewer noise sigmas apart than this.")
+    preview_parser.add_argument("--preview-margin", dest="preview_margin", type=float, default=None,
+                                help="Flag images with distance ratios this close to the threshold.")
+    preview_parser.add_argument("--output", default="preview.csv", help="Path of the CSV results.")
+    preview_parser.add_argument("--run-flagged", dest="run_flagged", action="store_true",
+                                help="Run the full analysis on the flagged images.")
+    preview_parser.add_argument("--no-resume", dest="resume", action="store_const", const=False, default=None)
+    preview_parser.set_defaults(handler=preview)
+
+    thresholds_parser = subparsers.add_parser("thresholds", help="Per-image and plate-wide Otsu thresholds.")
+    _add_config_arguments(thresholds_parser)
+    thresholds_parser.add_argument("--output-dir", dest="output_dir", default=None,
+                                   help="Histograms are cached in its histograms folder without --cache-dir.")
+    _add_histogram_arguments(thresholds_parser)
+    thresholds_parser.add_argument("--output", default="otsu_thresholds.csv", help="Path of the CSV results.")
+    thresholds_parser.set_defaults(handler=thresholds)
+
+    sweep_parser = subparsers.add_parser("sweep", help="Sweep the classification thresholds.")
+    _add_config_arguments(sweep_parser)
+    sweep_parser.add_argument("--output", default="parameter_sweep.csv", help="Path of the CSV results.")
+    sweep_parser.set_defaults(handler=sweep)
+
+    backends_parser = subparsers.add_parser("backends", help="Compare the morphology backends on images.")
+    _add_config_arguments(backends_parser)
+    backends_parser.set_defaults(handler=backends)
+
+    kernels_parser = subparsers.add_parser("kernels", help="Time the per-cell statistics kernels on tiny cells.")
+    kernels_parser.add_argument("--cells", type=int, default=20000)
+    kernels_parser.add_argument("--max-area", dest="max_area", type=int, default=5)
+    kernels_parser.add_argument("--high-intensity-fraction", dest="high_intensity_fraction", type=float, default=0.9)
+    kernels_parser.add_argument("--repeats", type=int, default=3)
+    kernels_parser.add_argument("--seed", type=int, default=0)
+    kernels_parser.set_defaults(handler=kernels)
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="Benchmark the pipelines on synthetic organoids.")
+    _add_benchmark_arguments(benchmark_parser)
+    benchmark_parser.set_defaults(handler=benchmark)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import os
+import json
+
+# Settings shared by both modes
+DEFAULTS = {
+    "mode": "count",                    # "classify" (Apical-in and Apical-out) or "count" (Apical-out only)
+    "min_cell_areas": [100, 50, 30, 15, 10, 5, 3],  # Minimum cell area thresholds, tried from largest to smallest
+    "high_intensity_fraction": 0.8,     # Fraction of a cell's maximum intensity that defines high-intensity pixels
+    "distance_ratio_threshold": 0.4,    # Cells with a lower distance ratio are Apical-out
+    "eccentricity_threshold": 0.4,      # Filter out nearly circular objects (0 = perfect circle)
+    "closing_radius": 10,               # Disk radius of the morphological closing
+    "dilation_radius": 3,               # Disk radius of the final dilation
+    "otsu_source": "image",             # "image" (Otsu per image) or "plate" (one Otsu pooled over control_images)
+    "control_images": None,             # Image titles pooled for the plate threshold (None = every image)
+    "otsu_threshold": None,             # Fixed threshold on the [0, 1] grayscale; "plate" runs fill it in
+    "histogram_bins": 4096,             # Fixed bins of the cached per-image intensity histograms
+    "projection": "max",                # How z-stacks are combined: "max" or "mean"
+    "tile_size": None,                  # Process images in tiles of this many pixels (None = whole image), for mosaics
+    "tile_workers": None,               # Worker processes per tiled image (None = the cores left per image worker)
+    "feature_mode": "per_region",       # "per_region" (bounding-box crop per cell) or "batched" (one EDT per image)
+    "morphology_backend": "skimage",    # "skimage" (reference), "decomposed", "opencv" or "edt"
+    "cache_dir": None,                  # Directory for cached Otsu/segmentation results (None disables the cache)
+    "cache_max_bytes": 2 * 1024 ** 3,   # Least recently used cache entries are evicted beyond this size
+    "workers": None,                    # Worker processes (None = all cores, 1 = run serially)
+    "chunk_size": 1,                    # Images handed to a worker at a time
+    "threads_per_worker": 1,            # BLAS/OpenMP threads allowed in each worker
+    "preview_factor": 4,                # Downsampling of `organoid-pipeline preview` (a power of two)
+    "preview_min_foreground": 0.001,    # Previews stop after Otsu below this foreground fraction
+    "preview_min_contrast": 4.0,        # ...or when the Otsu classes are less than this many noise sigmas apart
+    "preview_margin": 0.1,              # Distance ratios this close to the threshold need full resolution
+    "render_overlays": True,            # Write <image>_overlay.png next to the results
+    "overlay_scale": 1.0,               # Below 1 writes subsampled overlays for quick QC
+    "output_dir": "organoid_results",   # Workbook, overlays, result store and profile log
+    "workbook_name": "updated_cell_analysis.xlsx",
+    "resume": True,                     # Skip images that already have results in the store
+    "poll_interval": 10.0,              # Seconds between scans of a watched folder (`organoid-pipeline watch`)
+    "profile_log": "profile.jsonl",     # Per-image stage timings and counters in output_dir (None disables)
+    "image_files": {},                  # Image title -> image path
+}
+
+# Defaults that differ between the two modes (from Feature 1 try2.py and Feature 2 parameters.py)
+MODE_DEFAULTS = {
+    "classify": {
+        "min_cell_areas": [100, 50, 30, 15, 5],
+        "high_intensity_fraction": 0.7,
+        "distance_ratio_threshold": 0.7,
+    },
+    "count": {},
+}
+
+
+def read_config_file(config_path):
+    """
+    Read settings from a JSON or TOML file.
+
+    Relative image paths in "image_files" are resolved against the file's directory.
+
+    Parameters:
+        config_path (str): Path to a .json or .toml file with any of the keys of `DEFAULTS`.
+
+    Returns:
+        settings (dict): Settings found in the file.
+    """
+    if config_path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            raise ImportError("TOML config files need Python 3.11+; use a .json file instead.") from None
+        with open(config_path, "rb") as handle:
+            settings = tomllib.load(handle)
+    else:
+        with open(config_path) as handle:
+            settings = json.load(handle)
+
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+    if "image_files" in settings:
+        settings["image_files"] = {
+            image_name: os.path.join(base_dir, os.path.expanduser(image_path))
+            for image_name, image_path in settings["image_files"].items()
+        }
+    return settings
+
+
+def load_config(config_path=None, **overrides):
+    """
+    Build a complete configuration from the defaults, an optional file and explicit overrides.
+
+    Later sources win: mode defaults, then the file, then `overrides`.
+
+    Parameters:
+        config_path (str): Optional .json or .toml config file.
+        **overrides: Settings that take precedence over the file (e.g. from command-line arguments).
+
+    Returns:
+        config (dict): Every key of `DEFAULTS`.
+    """
+    settings = read_config_file(config_path) if config_path is not None else {}
+    settings.update(overrides)
+
+    unknown = set(settings) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown config keys: {sorted(unknown)}. Valid keys are {sorted(DEFAULTS)}.")
+    if settings.get("otsu_source", DEFAULTS["otsu_source"]) not in ("image", "plate"):
+        raise ValueError(f"Unknown otsu_source '{settings['otsu_source']}'. Use 'image' or 'plate'.")
+    mode = settings.get("mode", DEFAULTS["mode"])
+    if mode not in MODE_DEFAULTS:
+        raise ValueError(f"Unknown mode '{mode}'. Use 'classify' or 'count'.")
+
+    return {**DEFAULTS, **MODE_DEFAULTS[mode], **settings}
+
+
+def require_otsu_threshold(config, entry_point):
+    """
+    Raise when `config["otsu_source"]` is "plate" but the plate threshold has not been resolved.
+
+    Parameters:
+        config (dict): Pipeline configuration from `load_config`.
+        entry_point (str): Method that resolves the threshold for this caller, named in the error.
+    """
+    if config["otsu_source"] == "plate" and config["otsu_threshold"] is None:
+        raise ValueError(f"otsu_source='plate' needs the plate threshold: use {entry_point}, or set otsu_threshold "
+                         f"from Pipeline.plate_thresholds.")
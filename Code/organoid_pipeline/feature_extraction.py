@@ -0,0 +1,157 @@
+import numpy as np
+from scipy import ndimage as ndi
+from .kernels import region_ratio, label_ratios
+
+
+def padded_slice(bbox, shape, pad=1):
+    """
+    Build a slice covering a region's bounding box grown by `pad` pixels.
+
+    The extra ring guarantees that every pixel of the crop which is not part of
+    the region is background, so a distance transform computed on the crop is
+    identical to one computed on the full frame.
+
+    Parameters:
+        bbox (tuple): Bounding box as returned by `region.bbox` (min_row, min_col, max_row, max_col).
+        shape (tuple): Shape of the full image.
+        pad (int): Number of pixels to add on every side (clipped at the image border).
+
+    Returns:
+        cell_slice (tuple): Tuple of slices indexing the padded crop.
+    """
+    ndim = len(shape)
+    return tuple(
+        slice(max(bbox[axis] - pad, 0), min(bbox[axis + ndim] + pad, shape[axis]))
+        for axis in range(ndim)
+    )
+
+
+def distance_ratio(labels, region, img_gray, high_intensity_fraction, use_numba=None):
+    """
+    Compute the high-intensity distance ratio of a single region on its bounding-box crop.
+
+    Parameters:
+        labels (ndarray): Labeled image the region belongs to.
+        region (RegionProperties): Region from `measure.regionprops(labels)`.
+        img_gray (ndarray): Grayscale intensity image.
+        high_intensity_fraction (float): Fraction of the region's maximum intensity defining high-intensity pixels.
+        use_numba (bool): Compute the statistics with the compiled kernel (None = whenever numba is installed).
+
+    Returns:
+        distance_ratio (float): Mean distance of high-intensity pixels divided by the maximum distance.
+        cell_slice (tuple): Padded crop of the region in full-image coordinates.
+        cell_mask (ndarray): Boolean mask of the region inside `cell_slice`.
+    """
+    cell_slice = padded_slice(region.bbox, labels.shape)
+    cell_mask = labels[cell_slice] == region.label
+
+    # Compute the distance transform on the crop only, then the high-intensity statistics
+    dist_transform = ndi.distance_transform_edt(cell_mask)
+    ratio = region_ratio(cell_mask, dist_transform, img_gray[cell_slice], high_intensity_fraction, use_numba)
+
+    return ratio, cell_slice, cell_mask
+
+
+def batch_distance_ratios(labels, img_gray, high_intensity_fraction, use_numba=None):
+    """
+    Compute the high-intensity distance ratio of every region in one pass over the labeled image.
+
+    A single distance transform is run on the foreground. Because `measure.label` never
+    produces two touching labels, each pixel's nearest background pixel is the same as in
+    the per-region distance transform, so the values match `distance_ratio` up to
+    floating-point summation order.
+
+    Parameters:
+        labels (ndarray): Labeled image from `measure.label`.
+        img_gray (ndarray): Grayscale intensity image.
+        high_intensity_fraction (float): Fraction of each region's maximum intensity defining high-intensity pixels.
+        use_numba (bool): Compute the statistics with the compiled kernel (None = whenever numba is installed).
+
+    Returns:
+        ratios (ndarray): Distance ratio per label, indexed by label value (entry 0 is unused).
+    """
+    n_labels = int(labels.max())
+    if n_labels == 0:
+        return np.zeros(1)
+
+    dist_transform = ndi.distance_transform_edt(labels > 0)
+    return label_ratios(labels, dist_transform, img_gray, high_intensity_fraction, n_labels, use_numba)
+
+
+def label_moments(index, rows, cols, minlength=0):
+    """
+    Pixel count, centroid and centered second moments of every label from its pixel coordinates.
+
+    Parameters:
+        index (ndarray): Label (or compact label index) of each foreground pixel.
+        rows (ndarray): Row coordinate of each foreground pixel.
+        cols (ndarray): Column coordinate of each foreground pixel.
+        minlength (int): Minimum number of entries, e.g. `n_labels + 1` to index by label value.
+
+    Returns:
+        n (ndarray): Pixel count per entry.
+        means (ndarray): (row, col) centroid per entry (0 for empty entries).
+        moments (ndarray): Centered sums of d_row**2, d_col**2 and d_row*d_col per entry.
+    """
+    n = np.bincount(index, minlength=minlength).astype(np.float64)
+    safe_n = np.where(n > 0, n, 1)
+    mean_row = np.bincount(index, weights=rows, minlength=minlength) / safe_n
+    mean_col = np.bincount(index, weights=cols, minlength=minlength) / safe_n
+    d_row = rows - mean_row[index]
+    d_col = cols - mean_col[index]
+    moments = np.column_stack([
+        np.bincount(index, weights=d_row * d_row, minlength=minlength),
+        np.bincount(index, weights=d_col * d_col, minlength=minlength),
+        np.bincount(index, weights=d_row * d_col, minlength=minlength)
+    ])
+    return n, np.column_stack([mean_row, mean_col]), moments
+
+
+def moment_eccentricity(n, moments):
+    """
+    Eccentricity from the eigenvalues of the covariance matrix, as `regionprops` computes it.
+
+    Parameters:
+        n (ndarray): Pixel count per label.
+        moments (ndarray): Centered second moments per label from `label_moments`.
+
+    Returns:
+        eccentricity (ndarray): Eccentricity per label (0 for single pixels and empty entries).
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = moments / np.where(n > 0, n, 1)[:, np.newaxis]
+        half_trace = (variance[:, 0] + variance[:, 1]) / 2
+        root = np.sqrt(((variance[:, 0] - variance[:, 1]) / 2) ** 2 + variance[:, 2] ** 2)
+        major, minor = half_trace + root, np.clip(half_trace - root, 0, None)
+        return np.where(major > 0, np.sqrt(1 - minor / np.where(major > 0, major, 1)), 0)
+
+
+def region_table(labels, img_gray, high_intensity_fraction):
+    """
+    Collect area, eccentricity and distance ratio of every region without looping over `regionprops`.
+
+    Areas and eccentricities come from `np.bincount` moments of the foreground pixels, so the
+    cost is O(H*W) however many cells the image has.
+
+    Parameters:
+        labels (ndarray): Labeled image from `measure.label`.
+        img_gray (ndarray): Grayscale intensity image.
+        high_intensity_fraction (float): Fraction of each region's maximum intensity defining high-intensity pixels.
+
+    Returns:
+        table (dict): Arrays "label", "area", "eccentricity" and "distance_ratio", one entry per region in label order.
+    """
+    n_labels = int(labels.max()) if labels.size else 0
+    foreground = labels > 0
+    rows, cols = np.nonzero(foreground)
+    n, _, moments = label_moments(labels[foreground].astype(np.intp), rows, cols, minlength=n_labels + 1)
+    present = np.flatnonzero(n[1:]) + 1
+
+    ratios = batch_distance_ratios(labels, img_gray, high_intensity_fraction)
+    return {
+        "label": present,
+        "area": n[present],
+        "eccentricity": moment_eccentricity(n[present], moments[present]),
+        "distance_ratio": ratios[present]
+    }
+
@@ -0,0 +1,131 @@
+import os
+import numpy as np
+import pandas as pd
+from skimage import filters
+from .batch import worker_pool
+from .cache import cache_key, load_segmentation, save_segmentation
+from .image_loader import load_grayscale
+
+ROW_BLOCK = 1024  # Rows binned at a time, so the bin indices never need a full-image array
+
+
+def gray_histogram(img_gray, bins=4096):
+    """
+    Count the pixels of a grayscale image in fixed, equal-width bins over [0, 1].
+
+    Every image shares the same bins, so histograms of a plate can be added together.
+
+    Parameters:
+        img_gray (ndarray): float grayscale image in [0, 1] (see `image_loader.to_gray`).
+        bins (int): Number of bins.
+
+    Returns:
+        counts (ndarray): int64 pixel count per bin.
+    """
+    counts = np.zeros(bins, dtype=np.int64)
+    for start in range(0, img_gray.shape[0], ROW_BLOCK):
+        index = (img_gray[start:start + ROW_BLOCK] * bins).astype(np.intp)
+        np.clip(index, 0, bins - 1, out=index)
+        counts += np.bincount(index.ravel(), minlength=bins)
+    return counts
+
+
+def histogram_threshold(counts):
+    """
+    Otsu threshold of a fixed-bin histogram from `gray_histogram`, without the pixels.
+
+    Parameters:
+        counts (ndarray): Pixel count per bin (one image, or several added together).
+
+    Returns:
+        thresh (float): Upper edge of the last background bin, so resolved to 1 / len(counts) of the
+            intensity range; every pixel binned at or below the Otsu split stays below it.
+    """
+    bins = len(counts)
+    centers = (np.arange(bins) + 0.5) / bins
+    occupied = np.flatnonzero(counts)
+    if len(occupied) <= 1:
+        # Nothing to split: the top of the only bin leaves every pixel in the background
+        return float((occupied[0] + 1) / bins) if len(occupied) else 0.0
+    # Bins outside the occupied range do not move the Otsu split
+    span = slice(occupied[0], occupied[-1] + 1)
+    split = filters.threshold_otsu(hist=(counts[span], centers[span]))
+    # The center of the split bin would put the bin's upper half (e.g. a flat background) in the foreground
+    return float((np.floor(split * bins) + 1) / bins)
+
+
+def _histogram_dir(config):
+    # Histograms are small; without a cache_dir they are kept next to the results
+    if config["cache_dir"] is not None:
+        return config["cache_dir"]
+    return os.path.join(os.path.expanduser(config["output_dir"]), "histograms")
+
+
+def image_histogram(image_path, config):
+    """
+    Fixed-bin histogram of one image, read from the cache when it was built before.
+
+    Parameters:
+        image_path (str): Path to the image file (its content is part of the cache key).
+        config (dict): Pipeline configuration from `load_config`.
+
+    Returns:
+        counts (ndarray): Pixel count per bin of `config["histogram_bins"]` bins.
+    """
+    cache_dir = _histogram_dir(config)
+    key = cache_key(image_path, histogram_bins=config["histogram_bins"], projection=config["projection"])
+    cached = load_segmentation(cache_dir, key)
+    if cached is not None:
+        return cached["counts"]
+
+    counts = gray_histogram(load_grayscale(image_path, config["projection"]), config["histogram_bins"])
+    save_segmentation(cache_dir, key, {"counts": counts}, config["cache_max_bytes"])
+    return counts
+
+
+def _histogram_task(task):
+    image_path, config = task
+    return image_histogram(image_path, config)
+
+
+def plate_thresholds(image_files, config):
+    """
+    Per-image and plate-wide Otsu thresholds from one pass of fixed-bin histograms over a batch.
+
+    Each image is read once (or not at all when its histogram is cached); every threshold is
+    then computed from the histograms. The plate threshold pools the histograms of
+    `config["control_images"]` (every image when None), e.g. the control wells of a plate.
+
+    Parameters:
+        image_files (dict): Mapping of image title to image path.
+        config (dict): Pipeline configuration from `load_config`.
+
+    Returns:
+        df_thresholds (DataFrame): "Image Title", "Otsu Threshold", "Foreground Fraction" at the
+            plate threshold and "Control" per image.
+        plate_threshold (float): Otsu threshold of the pooled control histograms.
+    """
+    controls = list(image_files) if config["control_images"] is None else list(config["control_images"])
+    missing = sorted(set(controls) - set(image_files))
+    if missing:
+        raise ValueError(f"Control images not in the batch: {missing}")
+
+    tasks = [(image_path, config) for image_path in image_files.values()]
+    workers = min(config["workers"] or os.cpu_count() or 1, max(len(tasks), 1))
+    if workers == 1:
+        histograms = list(map(_histogram_task, tasks))
+    else:
+        with worker_pool(workers, config["threads_per_worker"]) as executor:
+            histograms = list(executor.map(_histogram_task, tasks))
+    histograms = dict(zip(image_files, histograms))
+
+    plate_threshold = histogram_threshold(np.sum([histograms[image_name] for image_name in controls], axis=0))
+    # Pixels in bins from the plate threshold's upper edge on are foreground at that threshold
+    first_foreground = int(round(plate_threshold * config["histogram_bins"]))
+    df_thresholds = pd.DataFrame([{
+        "Image Title": image_name,
+        "Otsu Threshold": histogram_threshold(counts),
+        "Foreground Fraction": round(float(counts[first_foreground:].sum() / max(counts.sum(), 1)), 6),
+        "Control": image_name in controls
+    } for image_name, counts in histograms.items()])
+    return df_thresholds, plate_threshold
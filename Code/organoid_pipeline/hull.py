@@ -0,0 +1,43 @@
+import numpy as np
+
+
+def hull_points(mask):
+    """
+    Collect the only foreground pixels that can be vertices of the mask's convex hull.
+
+    A hull vertex is an extreme point, so it is the leftmost or rightmost foreground
+    pixel of its row. Passing these (at most two per row) to `ConvexHull` gives the same
+    hull as passing every foreground pixel.
+
+    Parameters:
+        mask (ndarray): 2D boolean mask of the recorded cells.
+
+    Returns:
+        points (ndarray): (row, col) coordinates with shape (n, 2).
+    """
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return np.empty((0, 2), dtype=np.intp)
+    row_mask = mask[rows]
+    first = np.argmax(row_mask, axis=1)
+    last = row_mask.shape[1] - 1 - np.argmax(row_mask[:, ::-1], axis=1)
+    points = np.concatenate([np.column_stack((rows, first)), np.column_stack((rows, last))])
+    return np.unique(points, axis=0)
+
+
+def row_extremes(points):
+    """
+    Keep the leftmost and rightmost of a set of points in each row, e.g. to merge the `hull_points` of tiles.
+
+    Parameters:
+        points (ndarray): (row, col) coordinates with shape (n, 2).
+
+    Returns:
+        points (ndarray): At most two (row, col) points per row, in the order of `hull_points`.
+    """
+    if len(points) == 0:
+        return np.empty((0, 2), dtype=np.intp)
+    points = points[np.lexsort((points[:, 1], points[:, 0]))]
+    first = np.flatnonzero(np.diff(points[:, 0], prepend=points[0, 0] - 1))
+    last = np.append(first[1:], len(points)) - 1
+    return np.unique(np.concatenate([points[first], points[last]]), axis=0)
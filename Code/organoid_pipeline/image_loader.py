@@ -0,0 +1,209 @@
+import os
+import numpy as np
+import tifffile
+
+# Luminance weights used by skimage.color.rgb2gray
+RGB_WEIGHTS = np.array([0.2125, 0.7154, 0.0721], dtype=np.float32)
+
+
+def to_gray(frame, rgb=None, scale=None):
+    """
+    Convert one frame to a float32 grayscale image in [0, 1], allocating a single output array.
+
+    RGB frames use the `rgb2gray` weights on the dtype range; single-channel frames are
+    divided by their maximum, as in the original `img.astype(float) / np.max(img)`.
+
+    Parameters:
+        frame (ndarray): 2D frame, or 3D frame with color samples on the last axis.
+        rgb (bool): Whether the last axis holds color samples (None guesses from `frame.ndim`).
+        scale (float): Maximum of the whole image, for frames that are a window of it (None uses the frame's maximum).
+
+    Returns:
+        img_gray (ndarray): float32 grayscale image.
+    """
+    if rgb is None:
+        rgb = frame.ndim == 3
+    if rgb:
+        scale = np.iinfo(frame.dtype).max if np.issubdtype(frame.dtype, np.integer) else 1.0
+        img_gray = np.tensordot(frame[..., :3], RGB_WEIGHTS, axes=([-1], [0])).astype(np.float32, copy=False)
+        img_gray /= np.float32(scale)
+        return img_gray
+
+    img_gray = np.empty(frame.shape, dtype=np.float32)
+    np.divide(frame, np.max(frame) if scale is None else scale, out=img_gray, dtype=np.float32)
+    return img_gray
+
+
+def _iter_raw_frames(image_path):
+    # Yield (frame, rgb) pairs; TIFF frames are memory-mapped or read one page at a time
+    if not image_path.lower().endswith((".tif", ".tiff")):
+        from skimage import io
+        img = io.imread(image_path)
+        yield img, img.ndim == 3
+        return
+
+    with tifffile.TiffFile(image_path) as tif:
+        series = tif.series[0]
+        rgb = "S" in series.axes
+        frame_ndim = 3 if rgb else 2
+        try:
+            # Uncompressed, contiguous data: only the pages that are touched are read from disk
+            data = tifffile.memmap(image_path, mode="r")
+        except ValueError:
+            data = None
+
+        if data is not None:
+            if rgb:
+                data = np.moveaxis(data, series.axes.index("S"), -1)
+            for index in np.ndindex(data.shape[:-frame_ndim]):
+                yield data[index], rgb
+        else:
+            for page in series.pages:
+                frame = page.asarray()
+                if "S" in page.axes:
+                    frame = np.moveaxis(frame, page.axes.index("S"), -1)
+                yield frame, rgb
+
+
+def _project(frames, projection):
+    # Combine (frame, rgb) pairs into one frame; returns (None, False) when there are no frames
+    projected = None
+    rgb = False
+    n_frames = 0
+    for frame, rgb in frames:
+        n_frames += 1
+        if projected is None:
+            projected = np.array(frame, dtype=np.float32 if projection == "mean" else frame.dtype)
+        elif projection == "max":
+            np.maximum(projected, frame, out=projected)
+        else:
+            projected += frame
+
+    if projected is not None and projection == "mean":
+        projected /= n_frames
+        if rgb and np.issubdtype(frame.dtype, np.integer):
+            # Keep the RGB scaling of the source dtype now that the projection is float
+            projected /= np.iinfo(frame.dtype).max
+    return projected, rgb
+
+
+def open_image(image_path, decode_dir=None):
+    """
+    Open an image for reading in windows, memory-mapped when the file allows it.
+
+    Compressed TIFFs and other formats cannot be memory-mapped. They are read into memory, or,
+    with `decode_dir`, decoded once into an uncompressed .npy file there (TIFF strips and tiles
+    straight into the memory-mapped file) that every later call, from any process, maps instead.
+
+    Parameters:
+        image_path (str): Path to the image file.
+        decode_dir (str): Directory for the decoded copy (None reads compressed images into memory).
+
+    Returns:
+        data (ndarray): Image data with shape (*stack, rows, cols) or (*stack, rows, cols, samples).
+        rgb (bool): Whether the last axis holds color samples.
+    """
+    decoded_path = None if decode_dir is None else os.path.join(decode_dir, "decoded.npy")
+    if not image_path.lower().endswith((".tif", ".tiff")):
+        if decoded_path is not None and os.path.exists(decoded_path):
+            img = np.load(decoded_path, mmap_mode="r")
+        else:
+            from skimage import io
+            img = io.imread(image_path)
+            if decoded_path is not None:
+                np.save(decoded_path, img)
+        return img, img.ndim == 3
+
+    with tifffile.TiffFile(image_path) as tif:
+        series = tif.series[0]
+        try:
+            data = tifffile.memmap(image_path, mode="r")
+        except ValueError:
+            if decoded_path is None:
+                data = series.asarray()
+            elif os.path.exists(decoded_path):
+                data = np.load(decoded_path, mmap_mode="r")
+            else:
+                # Decode under a temporary name so a reader never maps a partial file
+                temp_path = decoded_path + ".tmp.npy"
+                data = np.lib.format.open_memmap(temp_path, mode="w+", dtype=series.dtype, shape=series.shape)
+                series.asarray(out=data)
+                data.flush()
+                del data
+                os.replace(temp_path, decoded_path)
+                data = np.load(decoded_path, mmap_mode="r")
+        if "S" in series.axes:
+            data = np.moveaxis(data, series.axes.index("S"), -1)
+            return data, True
+    return data, False
+
+
+def image_shape(data, rgb):
+    """
+    Rows and columns of an image opened with `open_image`.
+
+    Parameters:
+        data (ndarray): Image data from `open_image`.
+        rgb (bool): Whether the last axis holds color samples.
+
+    Returns:
+        shape (tuple): (rows, cols).
+    """
+    return data.shape[-3:-1] if rgb else data.shape[-2:]
+
+
+def project_window(data, rgb, rows, cols, projection="max"):
+    """
+    Project one window of an image opened with `open_image`, with the arithmetic of `load_grayscale`.
+
+    Parameters:
+        data (ndarray): Image data from `open_image`.
+        rgb (bool): Whether the last axis holds color samples.
+        rows (slice): Rows of the window.
+        cols (slice): Columns of the window.
+        projection (str): How z-stacks are combined: "max" or "mean" intensity projection.
+
+    Returns:
+        projected (ndarray): Projected window, to be converted with `to_gray`.
+    """
+    stack_shape = data.shape[:-3] if rgb else data.shape[:-2]
+    frames = ((data[index][rows, cols], rgb) for index in np.ndindex(stack_shape))
+    projected, _ = _project(frames, projection)
+    return projected
+
+
+def iter_pages(image_path):
+    """
+    Lazily iterate over the pages (z-slices) of an image as float32 grayscale frames.
+
+    Parameters:
+        image_path (str): Path to the image file.
+
+    Yields:
+        img_gray (ndarray): float32 grayscale frame of the next page.
+    """
+    for frame, rgb in _iter_raw_frames(image_path):
+        yield to_gray(frame, rgb)
+
+
+def load_grayscale(image_path, projection="max"):
+    """
+    Load an image as a single float32 grayscale frame, computed once and shared by all stages.
+
+    Multi-page stacks are projected page by page, so only the running projection and the
+    current page are held in memory.
+
+    Parameters:
+        image_path (str): Path to the image file.
+        projection (str): How z-stacks are combined: "max" or "mean" intensity projection.
+
+    Returns:
+        img_gray (ndarray): float32 grayscale image in [0, 1].
+    """
+    if projection not in ("max", "mean"):
+        raise ValueError(f"Unknown projection '{projection}'. Use 'max' or 'mean'.")
+
+    projected, rgb = _project(_iter_raw_frames(image_path), projection)
+    if projected is None:
+        raise ValueError(f"No image data found in {image_path}")
+    return to_gray(projected, rgb)
@@ -0,0 +1,221 @@
+import time
+import numpy as np
+
+# numba is optional: without it the NumPy implementations below are used
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+HAVE_NUMBA = njit is not None
+
+
+# -------- NumPy Implementations --------
+def _region_ratio_numpy(cell_mask, dist_transform, cell_image, high_intensity_fraction):
+    max_distance = np.max(dist_transform)
+    cell_intensity = cell_image[cell_mask]
+    intensity_threshold = high_intensity_fraction * np.max(cell_intensity)
+    high_intensity_mask = np.zeros_like(cell_mask, dtype=bool)
+    high_intensity_mask[cell_mask] = cell_intensity > intensity_threshold
+
+    mean_distance_high = np.mean(dist_transform[high_intensity_mask]) if np.sum(high_intensity_mask) > 0 else 0
+    return mean_distance_high / max_distance if max_distance > 0 else 0
+
+
+def _label_ratios_numpy(labels, dist_transform, img_gray, high_intensity_fraction, n_labels):
+    from scipy import ndimage as ndi
+
+    ratios = np.zeros(n_labels + 1)
+    index = np.arange(1, n_labels + 1)
+    foreground = labels > 0
+
+    # Per-label maximum intensity and maximum distance
+    max_intensity = np.zeros(n_labels + 1, dtype=img_gray.dtype)
+    max_intensity[1:] = ndi.maximum(img_gray, labels, index)
+    max_distance = np.zeros(n_labels + 1)
+    max_distance[1:] = ndi.maximum(dist_transform, labels, index)
+
+    # Mean distance of the high-intensity pixels of each label
+    high_intensity_mask = foreground & (img_gray > high_intensity_fraction * max_intensity[labels])
+    high_labels = labels[high_intensity_mask]
+    high_count = np.bincount(high_labels, minlength=n_labels + 1)
+    high_sum = np.bincount(high_labels, weights=dist_transform[high_intensity_mask], minlength=n_labels + 1)
+    mean_distance_high = np.divide(high_sum, high_count, out=np.zeros(n_labels + 1), where=high_count > 0)
+
+    np.divide(mean_distance_high, max_distance, out=ratios, where=max_distance > 0)
+    ratios[0] = 0
+    return ratios
+
+
+# -------- Compiled Kernels --------
+# Plain loops over the pixels: one pass for the maxima, one for the high-intensity mean,
+# and no temporary arrays. `high_intensity_fraction` arrives in the image dtype so the
+# threshold is rounded exactly as in the NumPy version.
+def _region_ratio_loop(cell_mask, dist_transform, cell_image, high_intensity_fraction):
+    rows, cols = cell_mask.shape
+    max_intensity = cell_image[0, 0]
+    max_distance = 0.0
+    found = False
+    for row in range(rows):
+        for col in range(cols):
+            if cell_mask[row, col]:
+                if not found or cell_image[row, col] > max_intensity:
+                    max_intensity = cell_image[row, col]
+                    found = True
+                if dist_transform[row, col] > max_distance:
+                    max_distance = dist_transform[row, col]
+
+    threshold = high_intensity_fraction * max_intensity
+    total = 0.0
+    n_high = 0
+    for row in range(rows):
+        for col in range(cols):
+            if cell_mask[row, col] and cell_image[row, col] > threshold:
+                total += dist_transform[row, col]
+                n_high += 1
+
+    if n_high == 0 or max_distance <= 0:
+        return 0.0
+    return total / n_high / max_distance
+
+
+def _label_ratios_loop(labels, dist_transform, img_gray, high_intensity_fraction, n_labels):
+    max_intensity = np.zeros(n_labels + 1, dtype=img_gray.dtype)
+    found = np.zeros(n_labels + 1, dtype=np.bool_)
+    max_distance = np.zeros(n_labels + 1)
+    for i in range(labels.size):
+        label = labels[i]
+        if label > 0:
+            if not found[label] or img_gray[i] > max_intensity[label]:
+                max_intensity[label] = img_gray[i]
+                found[label] = True
+            if dist_transform[i] > max_distance[label]:
+                max_distance[label] = dist_transform[i]
+
+    high_sum = np.zeros(n_labels + 1)
+    high_count = np.zeros(n_labels + 1, dtype=np.int64)
+    for i in range(labels.size):
+        label = labels[i]
+        if label > 0 and img_gray[i] > high_intensity_fraction * max_intensity[label]:
+            high_sum[label] += dist_transform[i]
+            high_count[label] += 1
+
+    ratios = np.zeros(n_labels + 1)
+    for label in range(1, n_labels + 1):
+        if high_count[label] > 0 and max_distance[label] > 0:
+            ratios[label] = high_sum[label] / high_count[label] / max_distance[label]
+    return ratios
+
+
+if HAVE_NUMBA:
+    _region_ratio_compiled = njit(cache=True, nogil=True)(_region_ratio_loop)
+    _label_ratios_compiled = njit(cache=True, nogil=True)(_label_ratios_loop)
+
+
+def _use_numba(use_numba):
+    if use_numba and not HAVE_NUMBA:
+        raise ImportError("use_numba=True needs numba; install it with `pip install numba`.")
+    return HAVE_NUMBA if use_numba is None else use_numba
+
+
+def region_ratio(cell_mask, dist_transform, cell_image, high_intensity_fraction, use_numba=None):
+    """
+    Distance ratio of one region: mean distance of its high-intensity pixels divided by its maximum distance.
+
+    Parameters:
+        cell_mask (ndarray): 2D boolean mask of the region (e.g. on its bounding-box crop).
+        dist_transform (ndarray): Distance transform of `cell_mask`.
+        cell_image (ndarray): Intensities on the same crop.
+        high_intensity_fraction (float): Fraction of the region's maximum intensity defining high-intensity pixels.
+        use_numba (bool): Use the compiled kernel (None = whenever numba is installed).
+
+    Returns:
+        distance_ratio (float): Distance ratio of the region (0 when undefined).
+    """
+    if _use_numba(use_numba) and cell_mask.ndim == 2:
+        fraction = np.asarray(high_intensity_fraction, dtype=cell_image.dtype)[()]
+        return _region_ratio_compiled(cell_mask, dist_transform, cell_image, fraction)
+    return _region_ratio_numpy(cell_mask, dist_transform, cell_image, high_intensity_fraction)
+
+
+def label_ratios(labels, dist_transform, img_gray, high_intensity_fraction, n_labels, use_numba=None):
+    """
+    Distance ratio of every label of a label image, given one distance transform of its foreground.
+
+    Parameters:
+        labels (ndarray): Label image.
+        dist_transform (ndarray): Distance transform of `labels > 0`.
+        img_gray (ndarray): Intensity image.
+        high_intensity_fraction (float): Fraction of each region's maximum intensity defining high-intensity pixels.
+        n_labels (int): Largest label value.
+        use_numba (bool): Use the compiled kernel (None = whenever numba is installed).
+
+    Returns:
+        ratios (ndarray): Distance ratio per label, indexed by label value (entry 0 is 0).
+    """
+    if _use_numba(use_numba):
+        fraction = np.asarray(high_intensity_fraction, dtype=img_gray.dtype)[()]
+        # ravel() only copies arrays that are not contiguous already
+        return _label_ratios_compiled(labels.ravel(), dist_transform.ravel(), img_gray.ravel(), fraction, n_labels)
+    return _label_ratios_numpy(labels, dist_transform, img_gray, high_intensity_fraction, n_labels)
+
+
+def compare_kernels(n_cells=20000, max_area=5, high_intensity_fraction=0.9, repeats=3, seed=0):
+    """
+    Microbenchmark of the per-cell statistics on a field of tiny cells, NumPy against numba.
+
+    Times the per-region path (`feature_extraction.distance_ratio` on every region, as in
+    "per_region" feature mode) and the batched path (`batch_distance_ratios`). The first
+    numba call of each kernel compiles it and is not timed.
+
+    Parameters:
+        n_cells (int): Number of cells in the synthetic image.
+        max_area (int): Largest cell area in pixels (the `min_cell_areas` 1-5 px passes).
+        high_intensity_fraction (float): Fraction of each cell's maximum intensity defining high-intensity pixels.
+        repeats (int): Number of timed runs per kernel; the fastest one is reported.
+        seed (int): Seed of the synthetic image.
+
+    Returns:
+        report (list): One dictionary per path and kernel with its runtime, speedup over NumPy
+            and largest absolute difference from the NumPy distance ratios.
+    """
+    from skimage import measure
+    from .feature_extraction import distance_ratio, batch_distance_ratios
+    from .synthetic import make_small_cells
+
+    img_gray, labels = make_small_cells(n_cells, max_area, seed)
+    regions = measure.regionprops(labels)
+
+    def per_region(use_numba):
+        return np.array([distance_ratio(labels, region, img_gray, high_intensity_fraction, use_numba)[0]
+                         for region in regions])
+
+    def batched(use_numba):
+        return batch_distance_ratios(labels, img_gray, high_intensity_fraction, use_numba)[1:]
+
+    report = []
+    for path, function in (("per_region", per_region), ("batched", batched)):
+        results = {}
+        for kernel, use_numba in (("numpy", False), ("numba", True)):
+            if use_numba and not HAVE_NUMBA:
+                continue
+            if use_numba:
+                function(use_numba)  # compile
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                ratios = function(use_numba)
+                timings.append(time.perf_counter() - start)
+            results[kernel] = (ratios, min(timings))
+
+        reference, reference_time = results["numpy"]
+        for kernel, (ratios, seconds) in results.items():
+            report.append({
+                "Path": path,
+                "Kernel": kernel,
+                "Cells": len(regions),
+                "Seconds": seconds,
+                "Speedup": reference_time / seconds if seconds > 0 else np.inf,
+                "Max Difference": float(np.max(np.abs(ratios - reference))) if len(ratios) else 0.0
+            })
+    return report
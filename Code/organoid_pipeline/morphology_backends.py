@@ -0,0 +1,130 @@
+import time
+import importlib.util
+import numpy as np
+from scipy import ndimage as ndi
+from skimage import morphology
+
+
+def _skimage_close_dilate(mask, closing_radius, dilation_radius):
+    closed = morphology.closing(mask, morphology.disk(closing_radius))
+    return morphology.binary_dilation(closed, morphology.disk(dilation_radius))
+
+
+def _decomposed_close_dilate(mask, closing_radius, dilation_radius):
+    # Sequence of small footprints approximating each disk
+    closed = morphology.binary_closing(mask, morphology.disk(closing_radius, decomposition="sequence"))
+    return morphology.binary_dilation(closed, morphology.disk(dilation_radius, decomposition="sequence"))
+
+
+def _opencv_close_dilate(mask, closing_radius, dilation_radius):
+    # OpenCV is optional and only imported by the backend that uses it
+    try:
+        import cv2
+    except ImportError:
+        raise ImportError("The 'opencv' morphology backend requires OpenCV (pip install opencv-python).") from None
+    # Same disk footprints as skimage, applied to a uint8 image
+    mask_u8 = mask.astype(np.uint8)
+    closing_kernel = morphology.disk(closing_radius).astype(np.uint8)
+    dilation_kernel = morphology.disk(dilation_radius).astype(np.uint8)
+    closed = cv2.morphologyEx(mask_u8, cv2.MORPH_CLOSE, closing_kernel)
+    return cv2.dilate(closed, dilation_kernel).astype(bool)
+
+
+def _edt_close_dilate(mask, closing_radius, dilation_radius):
+    # A pixel lies in the dilation by disk(r) iff its distance to the mask is <= r,
+    # and survives the erosion iff its distance to the background is > r
+    # The distance transform is undefined without a zero pixel: an empty mask stays empty,
+    # and eroding a dilation that covers the whole frame leaves it unchanged
+    if not mask.any():
+        return np.zeros(mask.shape, dtype=bool)
+    dilated = ndi.distance_transform_edt(~mask) <= closing_radius
+    closed = dilated if dilated.all() else ndi.distance_transform_edt(dilated) > closing_radius
+    return ndi.distance_transform_edt(~closed) <= dilation_radius
+
+
+BACKENDS = {
+    "skimage": _skimage_close_dilate,
+    "decomposed": _decomposed_close_dilate,
+    "opencv": _opencv_close_dilate,
+    "edt": _edt_close_dilate,
+}
+
+
+def close_and_dilate(mask, closing_radius=10, dilation_radius=3, backend="skimage"):
+    """
+    Apply the morphological closing followed by the dilation used during segmentation.
+
+    Parameters:
+        mask (ndarray): Binary image to smooth.
+        closing_radius (int): Radius of the disk used for the closing.
+        dilation_radius (int): Radius of the disk used for the dilation.
+        backend (str): One of "skimage" (reference), "decomposed", "opencv" or "edt".
+
+    Returns:
+        dilated (ndarray): Boolean image after closing and dilation.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown morphology backend '{backend}'. Choose from {sorted(BACKENDS)}.")
+    mask = np.asarray(mask, dtype=bool)
+    if not np.any(mask):
+        return np.zeros_like(mask)
+    return BACKENDS[backend](mask, closing_radius, dilation_radius)
+
+
+def compare_backends(mask, closing_radius=10, dilation_radius=3, repeats=3):
+    """
+    Benchmark every available backend against the skimage reference on one mask.
+
+    Parameters:
+        mask (ndarray): Binary image to smooth.
+        closing_radius (int): Radius of the disk used for the closing.
+        dilation_radius (int): Radius of the disk used for the dilation.
+        repeats (int): Number of timed runs per backend; the fastest one is reported.
+
+    Returns:
+        report (list): One dictionary per backend with its runtime, speedup and IoU against the reference mask.
+    """
+    results = {}
+    for backend in BACKENDS:
+        if backend == "opencv" and importlib.util.find_spec("cv2") is None:
+            continue
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            output = close_and_dilate(mask, closing_radius, dilation_radius, backend)
+            timings.append(time.perf_counter() - start)
+        results[backend] = (output, min(timings))
+
+    reference, reference_time = results["skimage"]
+    report = []
+    for backend, (output, seconds) in results.items():
+        union = np.count_nonzero(reference | output)
+        iou = float(np.count_nonzero(reference & output) / union) if union > 0 else 1.0
+        report.append({
+            "Backend": backend,
+            "Seconds": seconds,
+            "Speedup": reference_time / seconds if seconds > 0 else np.inf,
+            "IoU": iou
+        })
+    return report
+
+
+def pick_backend(report, tolerance=1e-3):
+    """
+    Choose the fastest backend whose IoU against the reference stays within tolerance.
+
+    Parameters:
+        report (list): Output of `compare_backends` (or several reports concatenated).
+        tolerance (float): Largest accepted loss of IoU, i.e. backends need IoU >= 1 - tolerance on every mask.
+
+    Returns:
+        backend (str): Name of the selected backend.
+    """
+    worst_iou = {}
+    total_time = {}
+    for row in report:
+        worst_iou[row["Backend"]] = min(worst_iou.get(row["Backend"], 1.0), row["IoU"])
+        total_time[row["Backend"]] = total_time.get(row["Backend"], 0.0) + row["Seconds"]
+    accepted = [backend for backend, iou in worst_iou.items() if iou >= 1 - tolerance]
+    return min(accepted, key=total_time.get)
+
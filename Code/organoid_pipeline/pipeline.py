@@ -0,0 +1,469 @@
+import os
+import time
+import numpy as np
+from scipy.spatial import ConvexHull
+from skimage import measure
+from .config import load_config, require_otsu_threshold
+from .feature_extraction import distance_ratio as region_distance_ratio, region_table
+from .segmentation import otsu_threshold, segment_cells
+from .cache import cache_key, load_segmentation, save_segmentation
+from .image_loader import load_grayscale
+from .hull import hull_points
+from .profiling import stage, count
+
+# Class code stored per label (0 = not recorded); render.CLASS_COLORS maps them to blue and red
+CLASS_CODES = {"Apical-out": 1, "Apical-in": 2}
+
+
+def segment_image(image_path, img_gray, config):
+    """
+    Threshold, fill and segment an image, reusing the on-disk cache when `config["cache_dir"]` is set.
+
+    The image's own Otsu threshold is used unless `config["otsu_threshold"]` fixes one (e.g. a plate threshold).
+
+    Parameters:
+        image_path (str): Path to the image file (its content is part of the cache key).
+        img_gray (ndarray): Grayscale image loaded from `image_path`.
+        config (dict): Pipeline configuration from `load_config`.
+
+    Returns:
+        thresh (float): Otsu threshold value.
+        filled (ndarray): Binary image after thresholding and hole filling.
+        labels (ndarray): Deduplicated label image.
+        region_thresholds (ndarray): min_cell_area threshold attributed to each label.
+    """
+    segmentation_parameters = {
+        "min_cell_areas": sorted(config["min_cell_areas"]),
+        "closing_radius": config["closing_radius"],
+        "dilation_radius": config["dilation_radius"],
+        "morphology_backend": config["morphology_backend"],
+        "projection": config["projection"]
+    }
+    if config["otsu_threshold"] is not None:
+        segmentation_parameters["otsu_threshold"] = config["otsu_threshold"]
+    else:
+        # The image's own threshold depends on the bins of its histogram
+        segmentation_parameters["histogram_bins"] = config["histogram_bins"]
+    key = None
+    if config["cache_dir"] is not None:
+        key = cache_key(image_path, **segmentation_parameters)
+        with stage("cache"):
+            cached = load_segmentation(config["cache_dir"], key)
+        if cached is not None:
+            return float(cached["thresh"]), cached["filled"], cached["labels"], cached["region_thresholds"]
+
+    filled, thresh = otsu_threshold(img_gray, config["otsu_threshold"], config["histogram_bins"])
+
+    # Segment once and attribute each region to the largest min_cell_area threshold it passes
+    with stage("segmentation"):
+        labels, region_thresholds = segment_cells(filled, config["min_cell_areas"], config["closing_radius"],
+                                                  config["dilation_radius"], config["morphology_backend"])
+
+    if key is not None:
+        with stage("cache"):
+            save_segmentation(config["cache_dir"], key, {
+                "thresh": np.asarray(thresh),
+                "filled": filled,
+                "labels": labels,
+                "region_thresholds": region_thresholds
+            }, config["cache_max_bytes"])
+    return thresh, filled, labels, region_thresholds
+
+
+def _filter_table(table, region_thresholds, config):
+    # Yield (label, min_cell_area, area, distance_ratio) for every row of a region table passing the filters
+    table_thresholds = region_thresholds[table["label"]]
+    passed_area = table["area"] >= table_thresholds
+    passed_shape = passed_area & (table["eccentricity"] >= config["eccentricity_threshold"])
+    count("regions examined", len(passed_area))
+    count("rejected by area", np.count_nonzero(~passed_area))
+    count("rejected by eccentricity", np.count_nonzero(passed_area & ~passed_shape))
+    for label, min_cell_area, area, distance_ratio in zip(
+            table["label"][passed_shape], table_thresholds[passed_shape], table["area"][passed_shape],
+            table["distance_ratio"][passed_shape]):
+        yield label, min_cell_area, area, distance_ratio
+
+
+def _scored_regions(labels, region_thresholds, img_gray, config):
+    # Yield (label, min_cell_area, area, distance_ratio) for every region passing the area and shape filters
+    if config["feature_mode"] == "batched":
+        # Score every region at once
+        yield from _filter_table(region_table(labels, img_gray, config["high_intensity_fraction"]),
+                                 region_thresholds, config)
+        return
+
+    for region in measure.regionprops(labels, intensity_image=img_gray):
+        min_cell_area = region_thresholds[region.label]
+
+        # Skip regions that do not meet the area or shape requirements
+        count("regions examined")
+        if region.area < min_cell_area:
+            count("rejected by area")
+            continue
+        if region.eccentricity < config["eccentricity_threshold"]:
+            count("rejected by eccentricity")
+            continue
+
+        # Compute the distance ratio on the region's padded bounding-box crop
+        distance_ratio, _, _ = region_distance_ratio(labels, region, img_gray, config["high_intensity_fraction"])
+        yield region.label, min_cell_area, region.area, distance_ratio
+
+
+def _record_cells(image_name, scored_regions, label_classes, config):
+    # Classify the scored regions, filling `label_classes` in place; returns the cell rows and per-class totals
+    classify = config["mode"] == "classify"
+    cell_data_list = []
+    class_counts = {"Apical-out": 0, "Apical-in": 0}
+    class_areas = {"Apical-out": 0, "Apical-in": 0}
+
+    for label, min_cell_area, area, distance_ratio in scored_regions:
+        # Classify cell as "Apical-out" if the distance ratio is below the threshold
+        cell_class = "Apical-out" if distance_ratio < config["distance_ratio_threshold"] else "Apical-in"
+        if cell_class == "Apical-in" and not classify:
+            count("rejected by distance ratio")
+            continue
+
+        cell_data_list.append({
+            "Image Title": image_name,
+            "Cell ID": len(cell_data_list) + 1,
+            "Min Cell Area Threshold": min_cell_area,
+            "Total Area": area,
+            "Classification": cell_class,
+            "Mean Intensity Ratio": distance_ratio
+        })
+        label_classes[label] = CLASS_CODES[cell_class]
+        class_counts[cell_class] += 1
+        class_areas[cell_class] += int(area)
+    count("cells recorded", len(cell_data_list))
+    return cell_data_list, class_counts, class_areas
+
+
+def _hull_summary(image_name, cell_coords, class_counts, class_areas, config):
+    # -------- Convex Hull and Area Calculation --------
+    # Cells never overlap, so the union area is the sum of the recorded cell areas.
+    # Returns the summary (empty when no cell was recorded) and the hull vertices (or None).
+    hull = ConvexHull(cell_coords) if cell_coords.size > 0 else None
+    if hull is None:
+        return {}, None
+
+    if config["mode"] == "classify":
+        convex_hull_area = hull.volume if hull.volume > 0 else 1e-6
+        convex_hull_summary = {"Image Title": image_name, "Convex Hull Area": convex_hull_area}
+        for cell_class in ("Apical-out", "Apical-in"):
+            convex_hull_summary[f"{cell_class} Count"] = class_counts[cell_class]
+            convex_hull_summary[f"{cell_class} Area"] = class_areas[cell_class]
+            convex_hull_summary[f"{cell_class} / Convex Hull Area"] = round(
+                min(class_areas[cell_class] / convex_hull_area, 1.0), 4)
+    else:
+        union_area = class_areas["Apical-out"]
+        convex_hull_area = hull.volume
+        convex_hull_summary = {
+            "Image Title": image_name,
+            "Union Cell Area": union_area,
+            "Convex Hull Area": convex_hull_area,
+            # Ensure the ratio does not exceed 1.0
+            "Union Cell Area / Convex Hull Area": min(union_area / convex_hull_area, 1.0) if convex_hull_area > 0 else 0
+        }
+    return convex_hull_summary, cell_coords[hull.vertices]
+
+
+def _process_tiled(image_name, image_path, config):
+    # Tiled variant of `process_image` for mosaics too large to hold in memory (bypasses the cache)
+    from .tiling import OVERLAY_MAX_SIDE, TiledImage
+    from .render import overlay_step
+
+    with TiledImage(image_path, config) as tiled:
+        _, n_labels, region_thresholds = tiled.segment(config["otsu_threshold"])
+        if n_labels == 0:
+            print(f"{image_name} - No cells found with min_cell_area = {min(config['min_cell_areas'])}")
+
+        label_classes = np.zeros(n_labels + 1, dtype=np.uint8)
+        with stage("features"):
+            cell_data_list, class_counts, class_areas = _record_cells(
+                image_name, _filter_table(tiled.region_table(), region_thresholds, config), label_classes, config)
+
+        # Only a subsampled preview of the mosaic is kept for the overlay, capped at OVERLAY_MAX_SIDE pixels a side
+        step = max(overlay_step(config["overlay_scale"]), -(-max(tiled.shape) // OVERLAY_MAX_SIDE))
+        if config["render_overlays"] and step > overlay_step(config["overlay_scale"]):
+            print(f"{image_name} - Overlay subsampled by {step} to stay within {OVERLAY_MAX_SIDE} pixels a side")
+        with stage("hull"):
+            cell_coords, preview = tiled.hull_points(label_classes, step if config["render_overlays"] else None)
+            convex_hull_summary, hull_vertices = _hull_summary(image_name, cell_coords, class_counts, class_areas,
+                                                               config)
+    labels, img_gray = preview if preview is not None else (None, None)
+    overlay = {
+        "img_gray": img_gray,
+        "labels": labels,
+        "label_classes": label_classes,
+        "hull_vertices": hull_vertices,
+        "step": step
+    }
+    return cell_data_list, convex_hull_summary, overlay
+
+
+def process_image(image_name, image_path, config):
+    """
+    Segment one image, classify its cells and summarize them against the convex hull of the recorded cells.
+
+    In "classify" mode every cell passing the area and shape filters is recorded as Apical-in or
+    Apical-out; in "count" mode only Apical-out cells are recorded. With `config["tile_size"]` set,
+    the image is processed in tiles (see `tiling.TiledImage`) with the batched features, and the
+    overlay holds a preview subsampled by "step" (from `config["overlay_scale"]`, coarser for mosaics
+    beyond `tiling.OVERLAY_MAX_SIDE` pixels a side).
+
+    Parameters:
+        image_name (str): Title of the image.
+        image_path (str): Path to the image file.
+        config (dict): Pipeline configuration from `load_config`.
+
+    Returns:
+        cell_data_list (list): One dictionary per recorded cell.
+        convex_hull_summary (dict): Convex hull and area summary of the image (empty when no cell was recorded).
+        overlay (dict): Grayscale image, label image, class code per label and hull vertices for the rendering stage.
+    """
+    require_otsu_threshold(config, "Pipeline.run")
+    if config["tile_size"] is not None:
+        return _process_tiled(image_name, image_path, config)
+
+    # Read the image once as float32 grayscale (memory-mapped TIFF, z-stacks projected)
+    with stage("load"):
+        img_gray = load_grayscale(image_path, config["projection"])
+
+    # Otsu thresholding, hole filling and segmentation (cached on disk when cache_dir is set)
+    thresh, filled, labels, region_thresholds = segment_image(image_path, img_gray, config)
+    if not np.any(labels):
+        print(f"{image_name} - No cells found with min_cell_area = {min(config['min_cell_areas'])}")
+
+    # Recorded cells are kept as a class code per segmentation label instead of a second label
+    # image; the RGB overlay is only built when rendering
+    label_classes = np.zeros(len(region_thresholds), dtype=np.uint8)
+    with stage("features"):
+        cell_data_list, class_counts, class_areas = _record_cells(
+            image_name, _scored_regions(labels, region_thresholds, img_gray, config), label_classes, config)
+
+    # Only the leftmost/rightmost cell pixel of each row can be a hull vertex
+    with stage("hull"):
+        cell_coords = hull_points((label_classes > 0)[labels])
+        convex_hull_summary, hull_vertices = _hull_summary(image_name, cell_coords, class_counts, class_areas, config)
+
+    # Inputs for the optional rendering stage: cells in their class color, yellow convex hull
+    overlay = {
+        "img_gray": img_gray,
+        "labels": labels,
+        "label_classes": label_classes,
+        "hull_vertices": hull_vertices
+    }
+
+    return cell_data_list, convex_hull_summary, overlay
+
+
+def summary_statistics(df_convex):
+    """
+    Batch-level totals and mean hull ratios of a classify-mode run (the workbook's "Summary" sheet).
+
+    Parameters:
+        df_convex (DataFrame): Convex Hull Summary rows of every image.
+
+    Returns:
+        df_summary (DataFrame): One row with the Apical-in/out totals and mean ratios to the hull area.
+    """
+    import pandas as pd
+
+    def column(name):
+        # Images without recorded cells have no counts and are left out of the means
+        return df_convex[name] if name in df_convex else pd.Series(dtype=float)
+
+    return pd.DataFrame([{
+        "Total Apical-in": column("Apical-in Count").sum(),
+        "Total Apical-out": column("Apical-out Count").sum(),
+        "Mean Apical-in / Hull": round(column("Apical-in / Convex Hull Area").mean(), 4),
+        "Mean Apical-out / Hull": round(column("Apical-out / Convex Hull Area").mean(), 4)
+    }])
+
+
+class Pipeline:
+    """
+    Organoid analysis pipeline in "classify" mode (Apical-in and Apical-out) or "count" mode (Apical-out only).
+
+    Parameters:
+        config (dict): Settings, e.g. from `load_config`; keys that are left out take their defaults.
+        **settings: Individual settings that override `config` (see `config.DEFAULTS`).
+    """
+
+    def __init__(self, config=None, **settings):
+        self.config = load_config(**{**(config or {}), **settings})
+
+    @classmethod
+    def from_file(cls, config_path, **settings):
+        """
+        Build a pipeline from a .json or .toml config file.
+
+        Parameters:
+            config_path (str): Config file path.
+            **settings: Settings that override the file.
+
+        Returns:
+            pipeline (Pipeline): Configured pipeline.
+        """
+        return cls(load_config(config_path, **settings))
+
+    @property
+    def mode(self):
+        return self.config["mode"]
+
+    def process_image(self, image_name, image_path):
+        """
+        Analyse one image; see `process_image` for the returned values.
+        """
+        return process_image(image_name, image_path, self.config)
+
+    def run(self, image_files=None):
+        """
+        Process a batch of images in parallel and export the results to an Excel workbook.
+
+        Each image is written to the result store as soon as it finishes, so an interrupted run
+        resumes where it stopped, and the workbook is built from the store at the end. Stored
+        results are only reused for the same file content (by digest) and the same analysis settings.
+
+        Parameters:
+            image_files (dict): Mapping of image title to image path (None uses `config["image_files"]`).
+
+        Returns:
+            output_excel_path (str): Path of the written workbook.
+        """
+        # Only the parent process needs the output stack
+        from .batch import iter_batch
+        from .cache import file_digest
+        from .results_store import (result_settings, read_manifest, write_manifest, is_complete, write_image_results,
+                                    write_failure, export_workbook)
+        from .profiling import write_log, summary_table
+
+        config = self.config
+        image_files = config["image_files"] if image_files is None else image_files
+        output_path = os.path.expanduser(config["output_dir"])
+        store_dir = os.path.join(output_path, "cell_analysis_results")
+        os.makedirs(output_path, exist_ok=True)
+
+        # One threshold pooled over the control images of the whole plate, not just of this batch
+        pipeline = self.with_plate_threshold(image_files)
+
+        # Images with results from an earlier (possibly interrupted) run of the same files and settings are skipped
+        manifest = read_manifest(store_dir, result_settings(pipeline.config))
+        digests = {image_name: file_digest(image_path) for image_name, image_path in image_files.items()
+                   if os.path.isfile(image_path)}
+        pending = {image_name: image_path for image_name, image_path in image_files.items()
+                   if not (config["resume"] and is_complete(store_dir, image_name, manifest, digests.get(image_name)))}
+        print(f"Processing {len(pending)} images ({len(image_files) - len(pending)} already done) ...")
+
+        profiles = []
+        for image_name, image_path, result, error, profile in iter_batch(
+                pipeline.process_image, pending, workers=config["workers"], chunk_size=config["chunk_size"],
+                threads_per_worker=config["threads_per_worker"],
+                overlay_dir=output_path if config["render_overlays"] else None,
+                overlay_scale=config["overlay_scale"]):
+            profiles.append(profile)
+            if config["profile_log"] is not None:
+                write_log(os.path.join(output_path, config["profile_log"]), profile)
+            if error is not None:
+                print(f"{image_name} - Failed:\n{error}")
+                write_failure(store_dir, image_name, image_path, error)
+                if manifest["images"].pop(image_name, None) is not None:
+                    write_manifest(store_dir, manifest)
+                continue
+            cell_data, convex_summary = result
+            print(f"Processed {image_name} (peak memory {convex_summary['Peak Memory (MB)']} MB)")
+            write_image_results(store_dir, image_name, cell_data, convex_summary)
+            manifest["images"][image_name] = digests.get(image_name)
+            write_manifest(store_dir, manifest)
+
+        # -------- Save Results to Excel --------
+        output_excel_path = os.path.join(output_path, config["workbook_name"])
+        export_start = time.perf_counter()
+        n_failed = export_workbook(store_dir, image_files, output_excel_path,
+                                   summarize=summary_statistics if self.mode == "classify" else None)
+        export_seconds = time.perf_counter() - export_start
+
+        # -------- Profiling Summary --------
+        if profiles:
+            print("\nPer-stage timings (s), peak RSS and region counters:")
+            print(summary_table(profiles).round(3).to_string(index=False))
+        print(f"Workbook export: {export_seconds:.2f} s")
+
+        if n_failed:
+            print(f"{n_failed} image(s) failed; see the 'Failed Images' sheet.")
+        print(f"Analysis complete. Results saved to: {output_excel_path}")
+        return output_excel_path
+
+    def plate_thresholds(self, image_files=None):
+        """
+        Per-image and plate-wide Otsu thresholds from cached fixed-bin histograms, see `histograms.plate_thresholds`.
+
+        Parameters:
+            image_files (dict): Mapping of image title to image path (None uses `config["image_files"]`).
+
+        Returns:
+            df_thresholds (DataFrame): Histogram Otsu threshold and foreground fraction per image.
+            plate_threshold (float): Otsu threshold pooled over `config["control_images"]`.
+        """
+        from .histograms import plate_thresholds
+
+        return plate_thresholds(self.config["image_files"] if image_files is None else image_files, self.config)
+
+    def with_plate_threshold(self, image_files=None):
+        """
+        Pipeline that thresholds every image with the plate threshold, when `config["otsu_source"]` is "plate".
+
+        The threshold is pooled over the control images of the whole plate: `config["image_files"]`
+        together with `image_files`, so running a subset of the plate (e.g. the images flagged by
+        a preview) uses the same threshold as the full plate. The per-image thresholds are written
+        to otsu_thresholds.csv in the output directory.
+
+        Parameters:
+            image_files (dict): Mapping of image title to image path of the batch about to run (None adds none).
+
+        Returns:
+            pipeline (Pipeline): Pipeline with `config["otsu_threshold"]` set, or this pipeline when there is
+                nothing to resolve.
+        """
+        config = self.config
+        if config["otsu_source"] != "plate" or config["otsu_threshold"] is not None:
+            return self
+
+        output_path = os.path.expanduser(config["output_dir"])
+        os.makedirs(output_path, exist_ok=True)
+        df_thresholds, plate_threshold = self.plate_thresholds({**config["image_files"], **(image_files or {})})
+        df_thresholds.to_csv(os.path.join(output_path, "otsu_thresholds.csv"), index=False)
+        print(f"Plate Otsu threshold: {plate_threshold:.4f} (per-image thresholds in otsu_thresholds.csv)")
+        return Pipeline(config, otsu_threshold=plate_threshold)
+
+    def preview(self, image_files=None):
+        """
+        Approximate counts and hull ratios from downsampled images, see `preview.preview_image`.
+
+        With `config["otsu_source"]` set to "plate", the plate threshold is resolved first (see `with_plate_threshold`).
+
+        Parameters:
+            image_files (dict): Mapping of image title to image path (None uses `config["image_files"]`).
+
+        Returns:
+            df_preview (DataFrame): One row per image, with "Needs Full Resolution" flagging images to run in full.
+        """
+        from .preview import preview_batch
+
+        image_files = self.config["image_files"] if image_files is None else image_files
+        return preview_batch(image_files, self.with_plate_threshold(image_files).config)
+
+    def watch(self, watch_dir, once=False):
+        """
+        Process images as they appear in a folder, see `watch.FolderWatcher`.
+
+        Parameters:
+            watch_dir (str): Folder the microscope writes images to.
+            once (bool): Process the images present now and return instead of watching.
+
+        Returns:
+            n_processed (int): Number of images processed (including failures).
+        """
+        from .watch import FolderWatcher
+
+        return FolderWatcher(self, watch_dir).run(once)
@@ -0,0 +1,191 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from scipy import ndimage as ndi
+from .batch import worker_pool
+from .config import require_otsu_threshold
+from .histograms import gray_histogram, histogram_threshold
+from .image_loader import load_grayscale
+from .segmentation import segment_cells
+from .feature_extraction import region_table
+from .hull import hull_points
+from .pipeline import _filter_table, _record_cells, _hull_summary
+
+# Cells smaller than this many preview pixels have no reliable shape or distance ratio
+MIN_RESOLVED_AREA = 4
+
+
+def downsample(img_gray, factor):
+    """
+    Reduce an image by a power of two with a mean pyramid (2x2 block means, level by level).
+
+    Parameters:
+        img_gray (ndarray): Grayscale image.
+        factor (int): Reduction factor per axis (1, 2, 4, 8, ...).
+
+    Returns:
+        reduced (ndarray): float32 image of shape ceil(shape / factor); odd edges repeat their last row or column.
+    """
+    levels = int(np.log2(factor)) if factor >= 1 else -1
+    if levels < 0 or 2 ** levels != factor:
+        raise ValueError(f"preview_factor must be a power of two, got {factor}.")
+    reduced = np.asarray(img_gray, dtype=np.float32)
+    for _ in range(levels):
+        padded = np.pad(reduced, ((0, reduced.shape[0] % 2), (0, reduced.shape[1] % 2)), mode="edge")
+        reduced = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2).mean(axis=(1, 3), dtype=np.float32)
+    return reduced
+
+
+def rescale_parameters(config, factor):
+    """
+    Rescale the area thresholds and footprint radii of a configuration to a downsampled image.
+
+    Parameters:
+        config (dict): Pipeline configuration from `load_config`.
+        factor (int): Reduction factor per axis.
+
+    Returns:
+        min_cell_areas (list): Thresholds divided by factor**2 (at least 1 pixel, duplicates merged).
+        closing_radius (int): Closing radius divided by factor (at least 1).
+        dilation_radius (int): Dilation radius divided by factor (at least 1).
+    """
+    min_cell_areas = sorted({max(int(round(area / factor ** 2)), 1) for area in config["min_cell_areas"]})
+    closing_radius = max(int(round(config["closing_radius"] / factor)), 1)
+    dilation_radius = max(int(round(config["dilation_radius"] / factor)), 1)
+    return min_cell_areas, closing_radius, dilation_radius
+
+
+def class_contrast(img_gray, thresh):
+    """
+    Gap between the mean intensities above and below a threshold, in units of the pixel noise.
+
+    The noise is estimated from the differences of horizontally adjacent pixels (median absolute
+    deviation), so it does not depend on where the threshold splits the image: noise alone gives
+    about 1.6 at its own Otsu threshold, stained cells on a dark background tens or more.
+
+    Parameters:
+        img_gray (ndarray): Grayscale image.
+        thresh (float): Intensity threshold.
+
+    Returns:
+        contrast (float): Class separation over the noise sigma (0 when a class is empty, inf on noise-free images).
+    """
+    binary = img_gray > thresh
+    n_foreground = np.count_nonzero(binary)
+    if n_foreground == 0 or n_foreground == binary.size:
+        return 0.0
+    separation = img_gray[binary].mean(dtype=np.float64) - img_gray[~binary].mean(dtype=np.float64)
+    differences = np.diff(img_gray.astype(np.float64), axis=1)
+    # Adjacent differences carry the noise twice: sigma = 1.4826 * MAD / sqrt(2)
+    noise = 1.4826 * np.median(np.abs(differences - np.median(differences))) / np.sqrt(2)
+    return float(separation / noise) if noise > 0 else np.inf
+
+
+def preview_image(image_name, image_path, config):
+    """
+    Approximate counts and hull ratios of one image from a downsampled copy, for triage and QC.
+
+    Otsu thresholding, segmentation and the batched features run on the image reduced by
+    `config["preview_factor"]`, with area thresholds and radii rescaled to match (and the
+    `config["otsu_threshold"]` when one is set). Images whose
+    Otsu foreground covers less than `config["preview_min_foreground"]` of the image, or whose
+    classes are less than `config["preview_min_contrast"]` noise sigmas apart (blank or noise-only
+    wells, which Otsu splits about evenly), stop right after thresholding. An image is flagged for full-resolution analysis when a cell's distance
+    ratio lies within `config["preview_margin"]` of the classification threshold, or when cells
+    are too small at preview resolution to measure.
+
+    Parameters:
+        image_name (str): Title of the image.
+        image_path (str): Path to the image file.
+        config (dict): Pipeline configuration from `load_config`.
+
+    Returns:
+        summary (dict): Approximate counts, areas and hull ratios in full-resolution pixels, the
+            foreground fraction and contrast, "Needs Full Resolution" with its "Reason", and the runtime.
+    """
+    start = time.perf_counter()
+    factor = config["preview_factor"]
+    classify = config["mode"] == "classify"
+    summary = {"Image Title": image_name, "Preview Factor": factor}
+
+    require_otsu_threshold(config, "Pipeline.preview")
+    img_gray = downsample(load_grayscale(image_path, config["projection"]), factor)
+    thresh = config["otsu_threshold"]
+    if thresh is None:
+        thresh = histogram_threshold(gray_histogram(img_gray, config["histogram_bins"]))
+    binary = img_gray > thresh
+    summary["Foreground Fraction"] = round(float(np.mean(binary)), 6)
+    summary["Contrast"] = round(class_contrast(img_gray, thresh), 3)
+    has_foreground = summary["Foreground Fraction"] >= config["preview_min_foreground"]
+    has_contrast = summary["Contrast"] >= config["preview_min_contrast"]
+
+    reasons = []
+    class_counts = {"Apical-out": 0, "Apical-in": 0}
+    if has_foreground and has_contrast:
+        min_cell_areas, closing_radius, dilation_radius = rescale_parameters(config, factor)
+        labels, region_thresholds = segment_cells(ndi.binary_fill_holes(binary), min_cell_areas, closing_radius,
+                                                  dilation_radius, config["morphology_backend"])
+        table = region_table(labels, img_gray, config["high_intensity_fraction"])
+        scored = list(_filter_table(table, region_thresholds, config))
+
+        label_classes = np.zeros(len(region_thresholds), dtype=np.uint8)
+        _, class_counts, class_areas = _record_cells(image_name, scored, label_classes, config)
+        # Areas and hull back in full-resolution pixels
+        class_areas = {cell_class: area * factor ** 2 for cell_class, area in class_areas.items()}
+        cell_coords = hull_points((label_classes > 0)[labels]) * factor
+        hull_summary, _ = _hull_summary(image_name, cell_coords, class_counts, class_areas, config)
+        summary.update(hull_summary)
+
+        ratios = np.array([distance_ratio for _, _, _, distance_ratio in scored])
+        areas = np.array([area for _, _, area, _ in scored])
+        summary["Ambiguous Cells"] = int(np.count_nonzero(
+            np.abs(ratios - config["distance_ratio_threshold"]) < config["preview_margin"]))
+        if summary["Ambiguous Cells"]:
+            reasons.append("distance ratios near the threshold")
+        if np.any(areas < MIN_RESOLVED_AREA):
+            reasons.append("cells too small for the preview")
+    else:
+        summary["Ambiguous Cells"] = 0
+
+    summary["Apical-out Count"] = class_counts["Apical-out"]
+    if classify:
+        summary["Apical-in Count"] = class_counts["Apical-in"]
+    summary["Needs Full Resolution"] = bool(reasons)
+    summary["Reason"] = "; ".join(reasons) if reasons else (
+        "no foreground" if not has_foreground else "no contrast" if not has_contrast else "")
+    summary["Seconds"] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def _preview_task(task):
+    image_name, image_path, config = task
+    try:
+        return preview_image(image_name, image_path, config)
+    except Exception as error:
+        # A failed preview is sent to the full analysis, which reports the error in its workbook
+        return {"Image Title": image_name, "Needs Full Resolution": True, "Reason": f"preview failed: {error}"}
+
+
+def preview_batch(image_files, config):
+    """
+    Preview a batch of images, in parallel when `config["workers"]` allows it.
+
+    With `config["otsu_source"]` set to "plate", `config["otsu_threshold"]` must hold the plate
+    threshold (see `Pipeline.with_plate_threshold`).
+
+    Parameters:
+        image_files (dict): Mapping of image title to image path.
+        config (dict): Pipeline configuration from `load_config`.
+
+    Returns:
+        df_preview (DataFrame): One row of `preview_image` per image, in `image_files` order.
+    """
+    # Checked here, as every per-image error would only flag the image
+    require_otsu_threshold(config, "Pipeline.preview")
+    tasks = [(image_name, image_path, config) for image_name, image_path in image_files.items()]
+    workers = min(config["workers"] or os.cpu_count() or 1, max(len(tasks), 1))
+    if workers == 1:
+        return pd.DataFrame(list(map(_preview_task, tasks)))
+    with worker_pool(workers, config["threads_per_worker"]) as executor:
+        return pd.DataFrame(list(executor.map(_preview_task, tasks)))
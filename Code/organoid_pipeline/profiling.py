@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+# psutil gives the current RSS on every platform; without it /proc or getrusage is used
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SAMPLE_INTERVAL = 0.05  # Seconds between background RSS samples
+
+# Profile of the image being processed in this process (None outside `profile_image`)
+_active = None
+
+
+def current_rss_mb():
+    """
+    Resident set size of the current process in MB.
+
+    Returns:
+        rss_mb (float): Current RSS, the peak RSS where only getrusage is available, or None if unknown.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    """
+    Accumulate wall time and call counts per stage.
+
+    Stages may nest; each stage is charged only for the time not spent in stages nested inside it.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name):
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._stack.pop()
+            self.seconds[name] = self.seconds.get(name, 0.0) + elapsed - nested
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self._stack:
+                self._stack[-1] += elapsed
+
+
+class ImageProfile:
+    """
+    Stage timings, peak RSS and counters collected while one image is processed.
+
+    RSS is sampled when a stage starts and ends and by a background thread in between,
+    so each stage gets the peak RSS seen while it was running.
+    """
+
+    def __init__(self, image_name):
+        self.image_name = image_name
+        self.timer = StageTimer()
+        self.counters = {}
+        self.stage_peak_rss = {}
+        self.peak_rss_mb = None
+        self.total_seconds = 0.0
+        self._open_stages = []
+        self._lock = threading.Lock()
+
+    def sample(self):
+        rss = current_rss_mb()
+        if rss is None:
+            return
+        with self._lock:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, rss)
+            for name in self._open_stages:
+                self.stage_peak_rss[name] = max(self.stage_peak_rss.get(name, 0.0), rss)
+
+    @contextmanager
+    def stage(self, name):
+        with self._lock:
+            self._open_stages.append(name)
+        self.sample()
+        try:
+            with self.timer.stage(name):
+                yield
+        finally:
+            self.sample()
+            with self._lock:
+                self._open_stages.pop()
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def record(self):
+        """
+        Returns:
+            record (dict): JSON-serializable profile with "Image Title", "Total (s)", "Peak RSS (MB)",
+                "stages" (seconds, calls and peak RSS per stage) and "counters".
+        """
+        stages = {
+            name: {
+                "seconds": round(seconds, 6),
+                "calls": self.timer.calls[name],
+                "peak_rss_mb": round(self.stage_peak_rss[name], 1) if name in self.stage_peak_rss else None
+            }
+            for name, seconds in self.timer.seconds.items()
+        }
+        return {
+            "Image Title": self.image_name,
+            "Total (s)": round(self.total_seconds, 6),
+            "Peak RSS (MB)": round(self.peak_rss_mb, 1) if self.peak_rss_mb is not None else None,
+            "stages": stages,
+            "counters": dict(self.counters)
+        }
+
+
+@contextmanager
+def profile_image(image_name, sample_interval=SAMPLE_INTERVAL):
+    """
+    Collect the stages and counters reported by the pipeline while one image is processed.
+
+    Parameters:
+        image_name (str): Title of the image.
+        sample_interval (float): Seconds between background RSS samples.
+
+    Yields:
+        profile (ImageProfile): Filled while the block runs; call `profile.record()` afterwards.
+    """
+    global _active
+    profile = ImageProfile(image_name)
+    stop = threading.Event()
+
+    def sample_until_stopped():
+        while not stop.wait(sample_interval):
+            profile.sample()
+
+    sampler = threading.Thread(target=sample_until_stopped, daemon=True)
+    previous, _active = _active, profile
+    start = time.perf_counter()
+    profile.sample()
+    sampler.start()
+    try:
+        yield profile
+    finally:
+        stop.set()
+        sampler.join()
+        profile.sample()
+        profile.total_seconds = time.perf_counter() - start
+        _active = previous
+
+
+def stage(name):
+    """
+    Time a stage of the image being profiled; does nothing outside `profile_image`.
+
+    Parameters:
+        name (str): Stage name (e.g. "morphology").
+
+    Returns:
+        context (context manager): Use as `with stage("morphology"): ...`.
+    """
+    if _active is None:
+        return nullcontext()
+    return _active.stage(name)
+
+
+def count(name, n=1):
+    """
+    Add `n` to a counter of the image being profiled; does nothing outside `profile_image`.
+
+    Parameters:
+        name (str): Counter name (e.g. "rejected by area").
+        n (int): Amount to add.
+    """
+    if _active is not None:
+        _active.count(name, n)
+
+
+def write_log(log_path, record):
+    """
+    Append one profile record to a JSON-lines log.
+
+    Parameters:
+        log_path (str): Path of the .jsonl log (created if missing).
+        record (dict): Output of `ImageProfile.record`.
+    """
+    with open(log_path, "a") as handle:
+        handle.write(json.dumps(record) + "\n")
+
+
+def summary_table(records):
+    """
+    Tabulate profile records with one row per image and a final row over all images.
+
+    Parameters:
+        records (list): Outputs of `ImageProfile.record`.
+
+    Returns:
+        df_profile (DataFrame): Total and per-stage seconds, peak RSS and counters per image.
+    """
+    import pandas as pd
+
+    rows = []
+    for record in records:
+        row = {"Image Title": record["Image Title"], "Total (s)": record["Total (s)"],
+               "Peak RSS (MB)": record["Peak RSS (MB)"]}
+        for name, values in record["stages"].items():
+            row[f"{name} (s)"] = values["seconds"]
+        row.update(record["counters"])
+        rows.append(row)
+    df_profile = pd.DataFrame(rows)
+    if df_profile.empty:
+        return df_profile
+
+    # Stages and counters an image never reached count as zero
+    value_columns = [column for column in df_profile.columns if column not in ("Image Title", "Peak RSS (MB)")]
+    df_profile[value_columns] = df_profile[value_columns].fillna(0)
+    totals = df_profile[value_columns].sum()
+    totals["Image Title"] = "All images"
+    totals["Peak RSS (MB)"] = df_profile["Peak RSS (MB)"].max()
+    df_profile.loc[len(df_profile)] = totals
+    counter_columns = {name for record in records for name in record["counters"]}
+    return df_profile.astype({name: int for name in counter_columns})
@@ -0,0 +1,82 @@
+import numpy as np
+from skimage import io, draw, util
+
+HULL_COLOR = (255, 255, 0)  # Yellow convex hull outline
+# RGB color per class code of `pipeline.CLASS_CODES`: unrecorded, Apical-out (blue), Apical-in (red)
+CLASS_COLORS = np.array([(0, 0, 0), (0, 0, 255), (255, 0, 0)], dtype=np.uint8)
+
+
+def overlay_step(scale):
+    """
+    Subsampling step of an overlay rendered at `scale`.
+
+    Parameters:
+        scale (float): Output scale; values below 1 keep every step-th row and column.
+
+    Returns:
+        step (int): Row and column step (1 at full scale).
+    """
+    return max(int(round(1 / scale)), 1) if scale < 1 else 1
+
+
+def build_overlay(img_gray, labels, label_classes, scale=1.0):
+    """
+    Build the RGB overlay of the classified cells directly as a uint8 array.
+
+    Parameters:
+        img_gray (ndarray): Grayscale image (float in [0, 1] or uint8).
+        labels (ndarray): Label image of the segmentation.
+        label_classes (ndarray): Class code per label, indexed by label value (0 = not drawn).
+        scale (float): Output scale; values below 1 subsample the image for quick QC previews.
+
+    Returns:
+        overlay_image (ndarray): uint8 RGB overlay.
+    """
+    step = overlay_step(scale)
+    gray = util.img_as_ubyte(img_gray[::step, ::step])
+    labels = labels[::step, ::step]
+
+    overlay_image = np.repeat(gray[..., np.newaxis], 3, axis=-1)
+    cell_classes = np.asarray(label_classes)[labels]
+    cell_mask = cell_classes > 0
+    overlay_image[cell_mask] = CLASS_COLORS[cell_classes[cell_mask]]
+    return overlay_image
+
+
+def draw_hull(overlay_image, hull_vertices, scale=1.0, thickness=2):
+    """
+    Draw the closed convex hull polygon onto the overlay in place.
+
+    Parameters:
+        overlay_image (ndarray): uint8 RGB overlay returned by `build_overlay`.
+        hull_vertices (ndarray): Hull vertices as (row, col) coordinates in the full-resolution image.
+        scale (float): Scale the overlay was built with.
+        thickness (int): Line width in pixels.
+    """
+    if hull_vertices is None or len(hull_vertices) < 2:
+        return
+    step = overlay_step(scale)
+    vertices = np.round(np.asarray(hull_vertices) / step).astype(int)
+    rows, cols = draw.polygon_perimeter(vertices[:, 0], vertices[:, 1], shape=overlay_image.shape[:2])
+    for offset in range(thickness):
+        overlay_image[np.clip(rows + offset, 0, overlay_image.shape[0] - 1),
+                      np.clip(cols + offset, 0, overlay_image.shape[1] - 1)] = HULL_COLOR
+
+
+def save_overlay(output_path, overlay, scale=1.0):
+    """
+    Render the overlay returned by `process_image` and write it as a PNG without matplotlib.
+
+    Parameters:
+        output_path (str): Destination PNG path.
+        overlay (dict): Rendering inputs with "img_gray", "labels", "label_classes" and "hull_vertices", and
+            "step" when the images are already subsampled (tiled mode).
+        scale (float): Output scale; values below 1 write a smaller image for quick QC.
+    """
+    # Subsample what the overlay's own step has not subsampled already
+    base_step = overlay.get("step", 1)
+    step = overlay_step(scale)
+    array_step = max(step // base_step, 1)
+    overlay_image = build_overlay(overlay["img_gray"], overlay["labels"], overlay["label_classes"], 1 / array_step)
+    draw_hull(overlay_image, overlay["hull_vertices"], 1 / (array_step * base_step))
+    io.imsave(output_path, overlay_image, check_contrast=False)
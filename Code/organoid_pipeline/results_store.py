@@ -0,0 +1,272 @@
+import os
+import re
+import json
+import hashlib
+import tempfile
+import pandas as pd
+
+# Parquet keeps column types and is faster to read back; CSV needs nothing beyond pandas
+try:
+    import pyarrow  # noqa: F401
+    STORE_FORMAT = "parquet"
+except ImportError:
+    STORE_FORMAT = "csv"
+
+# One file per image and table: "cells" (Cell Data), "summary" (Convex Hull Summary), "failed" (Failed Images)
+EXTENSIONS = {"parquet": ".parquet", "csv": ".csv"}
+MANIFEST_NAME = "store_manifest.json"
+# Settings that change the results; results stored with other values are never reused
+RESULT_SETTINGS = ("mode", "min_cell_areas", "high_intensity_fraction", "distance_ratio_threshold",
+                   "eccentricity_threshold", "closing_radius", "dilation_radius", "morphology_backend", "projection")
+
+
+def result_settings(config):
+    """
+    Settings fingerprint of a configuration, stored with results to decide whether they can be reused.
+
+    Parameters:
+        config (dict): Pipeline configuration from `load_config`.
+
+    Returns:
+        settings (dict): JSON-compatible values of `RESULT_SETTINGS`, and the fixed Otsu threshold or the
+            histogram bins of the per-image thresholds.
+    """
+    settings = {name: config[name] for name in RESULT_SETTINGS}
+    if config["otsu_threshold"] is not None:
+        settings["otsu_threshold"] = config["otsu_threshold"]
+    else:
+        # The image's own threshold depends on the bins of its histogram
+        settings["histogram_bins"] = config["histogram_bins"]
+    return json.loads(json.dumps(settings))
+
+
+def write_json(path, data):
+    """
+    Write a JSON file, replacing it in one step so a crash never leaves it half written.
+
+    Parameters:
+        path (str): Destination path.
+        data (dict): JSON-compatible data.
+    """
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(handle, "w") as temp:
+        json.dump(data, temp, indent=2)
+    os.replace(temp_path, path)
+
+
+def _part_stem(image_name):
+    # Readable, filesystem-safe name; the hash keeps titles that sanitize alike apart
+    safe_name = re.sub(r"[^\w.-]+", "_", image_name)
+    return f"{safe_name}-{hashlib.sha1(image_name.encode()).hexdigest()[:8]}"
+
+
+def _part_path(store_dir, table, image_name, store_format=STORE_FORMAT):
+    return os.path.join(store_dir, table, _part_stem(image_name) + EXTENSIONS[store_format])
+
+
+def _find_part(store_dir, table, image_name):
+    # Parts written in either format are read back, so a store survives installing pyarrow
+    for store_format in EXTENSIONS:
+        path = _part_path(store_dir, table, image_name, store_format)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _remove_part(store_dir, table, image_name):
+    path = _find_part(store_dir, table, image_name)
+    while path is not None:
+        os.remove(path)
+        path = _find_part(store_dir, table, image_name)
+
+
+def _write_part(store_dir, table, image_name, df):
+    path = _part_path(store_dir, table, image_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first so a crash never leaves a partial part behind
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(handle)
+    try:
+        if STORE_FORMAT == "parquet":
+            df.to_parquet(temp_path, index=False)
+        else:
+            df.to_csv(temp_path, index=False)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _read_part(path):
+    if path.endswith(EXTENSIONS["parquet"]):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype={"Image Title": str})
+
+
+def read_manifest(store_dir, settings):
+    """
+    Read the store manifest, which records the content digest each stored image was computed from.
+
+    Results stored with other settings (or before the store had a manifest) are not reused: the
+    manifest comes back empty, so every image is processed again and its results replaced.
+
+    Parameters:
+        store_dir (str): Result store directory.
+        settings (dict): Fingerprint of the current configuration from `result_settings`.
+
+    Returns:
+        manifest (dict): {"settings": settings, "images": {image title: content digest}}.
+    """
+    manifest_path = os.path.join(store_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+        if manifest["settings"] == settings:
+            return manifest
+        if manifest["images"]:
+            print(f"Results in {store_dir} were computed with other settings ({manifest['settings']}); "
+                  f"reprocessing every image.")
+    return {"settings": settings, "images": {}}
+
+
+def write_manifest(store_dir, manifest):
+    """
+    Save the store manifest from `read_manifest`.
+
+    Parameters:
+        store_dir (str): Result store directory (created if missing).
+        manifest (dict): Manifest to write.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    write_json(os.path.join(store_dir, MANIFEST_NAME), manifest)
+
+
+def is_complete(store_dir, image_name, manifest, digest):
+    """
+    Check whether an image already has results in the store for this content and these settings,
+    so a rerun can skip it.
+
+    Parameters:
+        store_dir (str): Result store directory.
+        image_name (str): Title of the image.
+        manifest (dict): Store manifest from `read_manifest` for the current settings.
+        digest (str): Content digest of the image file (see `cache.file_digest`).
+
+    Returns:
+        complete (bool): True when the image's summary row was written from the same file content.
+    """
+    return digest is not None and manifest["images"].get(image_name) == digest and \
+        _find_part(store_dir, "summary", image_name) is not None
+
+
+def write_image_results(store_dir, image_name, cell_data, convex_summary):
+    """
+    Append the results of one image to the store as soon as it finishes.
+
+    The cell rows are written before the summary row, and the summary row marks the image
+    as complete, so an interrupted write is simply redone on the next run.
+
+    Parameters:
+        store_dir (str): Result store directory (created if missing).
+        image_name (str): Title of the image.
+        cell_data (list): Cell dictionaries returned by `process_image`.
+        convex_summary (dict): Convex hull summary of the image.
+    """
+    if cell_data:
+        _write_part(store_dir, "cells", image_name, pd.DataFrame(cell_data))
+    else:
+        _remove_part(store_dir, "cells", image_name)
+    _write_part(store_dir, "summary", image_name, pd.DataFrame([{"Image Title": image_name, **convex_summary}]))
+    _remove_part(store_dir, "failed", image_name)
+
+
+def write_failure(store_dir, image_name, image_path, error):
+    """
+    Record a failed image; it is not marked complete, so the next run retries it.
+
+    Results stored for the image by an earlier run are removed, so they never stand in for the failure.
+
+    Parameters:
+        store_dir (str): Result store directory (created if missing).
+        image_name (str): Title of the image.
+        image_path (str): Path to the image file.
+        error (str): Traceback of the failure.
+    """
+    _remove_part(store_dir, "summary", image_name)
+    _remove_part(store_dir, "cells", image_name)
+    _write_part(store_dir, "failed", image_name,
+                pd.DataFrame([{"Image Title": image_name, "Image Path": image_path, "Error": error}]))
+
+
+def read_table(store_dir, table, image_names):
+    """
+    Read one table back from the store, one image at a time.
+
+    Parameters:
+        store_dir (str): Result store directory.
+        table (str): "cells", "summary" or "failed".
+        image_names (iterable): Titles of the images to include, in output order.
+
+    Returns:
+        df (DataFrame): Rows of the listed images (empty when none have this table).
+    """
+    parts = []
+    for image_name in image_names:
+        path = _find_part(store_dir, table, image_name)
+        if path is not None:
+            parts.append(_read_part(path))
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts, ignore_index=True)
+
+
+def export_workbook(store_dir, image_names, output_excel_path, summarize=None):
+    """
+    Build the Excel workbook from the store once the batch has finished.
+
+    Parameters:
+        store_dir (str): Result store directory.
+        image_names (list): Titles of the images to include, in output order.
+        output_excel_path (str): Destination .xlsx path.
+        summarize (callable): Optional `summarize(df_convex)` returning a DataFrame written to a "Summary" sheet.
+
+    Returns:
+        n_failed (int): Number of images listed in the "Failed Images" sheet.
+    """
+    image_names = list(image_names)
+    df_cells = read_table(store_dir, "cells", image_names)
+    df_convex = read_table(store_dir, "summary", image_names)
+    df_failed = read_table(store_dir, "failed", image_names)
+    write_workbook(output_excel_path, df_cells, df_convex, df_failed, summarize)
+    return len(df_failed)
+
+
+def write_workbook(output_excel_path, df_cells, df_convex, df_failed, summarize=None):
+    """
+    Write the result tables to the Excel workbook, replacing it in one step.
+
+    The workbook is written to a temporary file first, so readers never open a partial workbook.
+
+    Parameters:
+        output_excel_path (str): Destination .xlsx path.
+        df_cells (DataFrame): Cell Data rows.
+        df_convex (DataFrame): Convex Hull Summary rows.
+        df_failed (DataFrame): Failed Images rows (the sheet is left out when empty).
+        summarize (callable): Optional `summarize(df_convex)` returning a DataFrame written to a "Summary" sheet.
+    """
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output_excel_path)), suffix=".xlsx")
+    os.close(handle)
+    try:
+        with pd.ExcelWriter(temp_path) as writer:
+            df_cells.to_excel(writer, sheet_name="Cell Data", index=False)
+            df_convex.to_excel(writer, sheet_name="Convex Hull Summary", index=False)
+            if summarize is not None:
+                summarize(df_convex).to_excel(writer, sheet_name="Summary", index=False)
+            if not df_failed.empty:
+                df_failed.to_excel(writer, sheet_name="Failed Images", index=False)
+        os.replace(temp_path, output_excel_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
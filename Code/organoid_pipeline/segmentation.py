@@ -0,0 +1,145 @@
+import numpy as np
+from scipy import ndimage as ndi
+from skimage import measure
+from .histograms import gray_histogram, histogram_threshold
+from .morphology_backends import close_and_dilate
+from .profiling import stage
+
+
+def label_dtype(max_label):
+    """
+    Smallest unsigned integer dtype that holds every label up to `max_label`.
+
+    Parameters:
+        max_label (int): Largest label value to store.
+
+    Returns:
+        dtype (dtype): uint8, uint16, uint32 or uint64.
+    """
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_label <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def area_thresholds(areas, min_cell_areas):
+    """
+    Attribute each connected component to the largest minimum cell area it passes.
+
+    Parameters:
+        areas (ndarray): Pixel count per component, indexed by component label (entry 0 is the background).
+        min_cell_areas (list): Minimum cell area thresholds, in any order.
+
+    Returns:
+        component_thresholds (ndarray): Threshold per component (0 for the background and components passing none).
+    """
+    thresholds = np.sort(np.asarray(min_cell_areas))
+    passed = np.searchsorted(thresholds, areas, side="right") - 1
+    component_thresholds = np.where(passed >= 0, thresholds[np.clip(passed, 0, None)], 0)
+    component_thresholds[0] = 0
+    return component_thresholds
+
+
+def otsu_threshold(img_gray, thresh=None, bins=4096):
+    """
+    Threshold a grayscale image with Otsu's method and fill the holes of the mask.
+
+    The image's own threshold is taken from its fixed-bin histogram, the same value
+    `histograms.plate_thresholds` reports for the image.
+
+    Parameters:
+        img_gray (ndarray): Grayscale image in [0, 1].
+        thresh (float): Threshold to use instead of the image's own Otsu threshold (e.g. a plate threshold).
+        bins (int): Histogram bins of the image's own threshold (`config["histogram_bins"]`).
+
+    Returns:
+        filled (ndarray): Binary image after thresholding and hole filling.
+        thresh (float): Otsu threshold value.
+    """
+    with stage("otsu"):
+        if thresh is None:
+            thresh = histogram_threshold(gray_histogram(img_gray, bins))
+        binary = img_gray > thresh
+    with stage("fill"):
+        filled = ndi.binary_fill_holes(binary)
+    return filled, thresh
+
+
+def remove_small_cells(filled, min_cell_area):
+    """
+    Drop the components of a mask smaller than one minimum cell area.
+
+    Same as `remove_small_objects(filled, min_size=min_cell_area)` in the original per-threshold
+    loop: the mask the closing and dilation smooth for that threshold (see `segment_cells`).
+
+    Parameters:
+        filled (ndarray): Binary image after Otsu thresholding and hole filling.
+        min_cell_area (int): Minimum component area in pixels (4-connected).
+
+    Returns:
+        cleaned (ndarray): Binary image of the components with at least `min_cell_area` pixels.
+    """
+    components, n_components = ndi.label(filled)
+    areas = np.bincount(components.ravel(), minlength=n_components + 1)
+    keep = areas >= min_cell_area
+    keep[0] = False
+    return keep[components]
+
+
+def segment_cells(filled, min_cell_areas, closing_radius=10, dilation_radius=3, morphology_backend="skimage"):
+    """
+    Segment the filled Otsu mask once for all minimum cell area thresholds.
+
+    Connected components are labeled and measured a single time. Each component is
+    attributed to the largest threshold in `min_cell_areas` it passes, components
+    smaller than every threshold are dropped, and the closing/dilation and final
+    labeling run once on what is left. A final region takes the largest threshold of
+    the components it contains, so every cell is detected exactly once.
+
+    Parameters:
+        filled (ndarray): Binary image after Otsu thresholding and hole filling.
+        min_cell_areas (list): Minimum cell area thresholds, in any order.
+        closing_radius (int): Radius of the disk used for morphological closing.
+        dilation_radius (int): Radius of the disk used for the final dilation.
+        morphology_backend (str): Backend from `morphology_backends.BACKENDS` used for the closing and dilation.
+
+    Returns:
+        labels (ndarray): Deduplicated label image, numbered by decreasing threshold and then by position,
+            in the smallest unsigned dtype that fits the number of labels (see `label_dtype`).
+        region_thresholds (ndarray): Threshold attributed to each label, indexed by label value (entry 0 is unused).
+    """
+    # Same 4-connectivity as remove_small_objects, so areas match the per-threshold loop
+    with stage("labeling"):
+        components, n_components = ndi.label(filled)
+    areas = np.bincount(components.ravel(), minlength=n_components + 1)
+
+    # Largest threshold each component passes (0 if it passes none)
+    component_thresholds = area_thresholds(areas, min_cell_areas)
+    # The per-pixel threshold image only needs the range of the thresholds
+    threshold_image = component_thresholds.astype(np.min_scalar_type(max(min_cell_areas)))[components]
+
+    cleaned = threshold_image > 0
+    if not np.any(cleaned):
+        return np.zeros(filled.shape, dtype=np.uint8), np.zeros(1, dtype=component_thresholds.dtype)
+
+    # Apply morphological closing and dilation once on the deduplicated mask
+    with stage("morphology"):
+        dilated = close_and_dilate(cleaned, closing_radius, dilation_radius, morphology_backend)
+    with stage("labeling"):
+        labels = measure.label(dilated)
+
+    n_labels = int(labels.max())
+    index = np.arange(1, n_labels + 1)
+    # Largest component threshold inside each final label, from the cleaned pixels only
+    label_thresholds = np.zeros(n_labels + 1, dtype=component_thresholds.dtype)
+    np.maximum.at(label_thresholds, labels[cleaned], threshold_image[cleaned])
+    label_thresholds = label_thresholds[1:]
+
+    # Renumber so labels follow the order of the original threshold loop, storing them compactly
+    order = np.lexsort((index, -label_thresholds))
+    lookup = np.zeros(n_labels + 1, dtype=label_dtype(n_labels))
+    lookup[index[order]] = index
+    region_thresholds = np.zeros(n_labels + 1, dtype=component_thresholds.dtype)
+    region_thresholds[1:] = label_thresholds[order]
+
+    return lookup[labels], region_thresholds
@@ -0,0 +1,204 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import ndimage as ndi
+from scipy.spatial import ConvexHull, QhullError
+from skimage import measure
+from .config import load_config
+from .pipeline import segment_image, _hull_summary
+from .image_loader import load_grayscale
+
+
+def _hull_points(coords):
+    # Hull vertices of one cell, or all of its pixels when they are collinear
+    if len(coords) < 3:
+        return coords
+    try:
+        return coords[ConvexHull(coords).vertices]
+    except QhullError:
+        return coords
+
+
+def cell_features(image_path, config):
+    """
+    Compute the per-cell quantities every grid point of a sweep is scored from.
+
+    Pixels of each cell are sorted by decreasing intensity next to their EDT values, so
+    the high-intensity pixels of any `high_intensity_fraction` form a prefix whose mean
+    distance comes from a cumulative sum.
+
+    Parameters:
+        image_path (str): Path to the image file.
+        config (dict): Pipeline configuration providing the segmentation settings.
+
+    Returns:
+        features (dict): Per-cell "area", "min_cell_area", "eccentricity", "max_distance", "max_intensity" and
+            "hull_points", plus the sorted pixel arrays used by `distance_ratios`.
+    """
+    img_gray = load_grayscale(image_path, config["projection"])
+    _, _, labels, region_thresholds = segment_image(image_path, img_gray, config)
+
+    n_labels = int(labels.max())
+    index = np.arange(1, n_labels + 1)
+    foreground = labels > 0
+    # Labels never touch, so one EDT of the foreground equals the per-cell EDTs
+    dist_transform = ndi.distance_transform_edt(foreground)
+
+    pixel_labels = labels[foreground]
+    pixel_intensity = img_gray[foreground]
+    pixel_distance = dist_transform[foreground]
+
+    # Sort pixels by cell, then by decreasing intensity, and rank intensities exactly
+    order = np.lexsort((-pixel_intensity, pixel_labels))
+    pixel_labels = pixel_labels[order]
+    pixel_distance = pixel_distance[order]
+    intensity_values, intensity_rank = np.unique(pixel_intensity[order], return_inverse=True)
+    n_values = len(intensity_values)
+    sort_keys = pixel_labels.astype(np.int64) * (n_values + 1) + (n_values - intensity_rank)
+
+    table = measure.regionprops_table(labels, properties=("label", "area", "eccentricity", "coords"))
+    return {
+        "area": np.asarray(table["area"], dtype=float),
+        "min_cell_area": np.asarray(region_thresholds[table["label"]]),
+        "eccentricity": np.asarray(table["eccentricity"], dtype=float),
+        "max_distance": np.asarray(ndi.maximum(dist_transform, labels, index)) if n_labels else np.zeros(0),
+        "max_intensity": np.asarray(ndi.maximum(img_gray, labels, index)) if n_labels else np.zeros(0),
+        "hull_points": [_hull_points(coords) for coords in table["coords"]],
+        "starts": np.searchsorted(pixel_labels, index),
+        "sort_keys": sort_keys,
+        "intensity_values": intensity_values,
+        "distance_cumsum": np.concatenate(([0.0], np.cumsum(pixel_distance))),
+    }
+
+
+def distance_ratios(features, high_intensity_fractions):
+    """
+    Score the distance ratio of every cell for several high-intensity fractions at once.
+
+    Parameters:
+        features (dict): Output of `cell_features`.
+        high_intensity_fractions (array-like): Fractions to evaluate.
+
+    Returns:
+        ratios (ndarray): Distance ratios with shape (number of fractions, number of cells).
+    """
+    fractions = np.asarray(high_intensity_fractions, dtype=float)
+    n_cells = len(features["area"])
+    if n_cells == 0:
+        return np.zeros((len(fractions), 0))
+
+    cell_keys = np.arange(1, n_cells + 1, dtype=np.int64) * (len(features["intensity_values"]) + 1)
+    # Same precision as `high_intensity_fraction * np.max(cell_intensity)` in the pipeline
+    max_intensity = features["max_intensity"]
+    thresholds = fractions.astype(max_intensity.dtype)[:, np.newaxis] * max_intensity[np.newaxis, :]
+
+    # Pixels brighter than the threshold are the first `counts` pixels of each cell
+    first_rank = np.searchsorted(features["intensity_values"], thresholds, side="right")
+    last_key = cell_keys[np.newaxis, :] + len(features["intensity_values"]) - first_rank
+    counts = np.searchsorted(features["sort_keys"], last_key, side="right") - features["starts"][np.newaxis, :]
+
+    starts = features["starts"][np.newaxis, :]
+    cumsum = features["distance_cumsum"]
+    sums = cumsum[starts + counts] - cumsum[starts]
+    mean_distance_high = np.divide(sums, counts, out=np.zeros(sums.shape), where=counts > 0)
+    max_distance = np.broadcast_to(features["max_distance"], sums.shape)
+    return np.divide(mean_distance_high, max_distance, out=np.zeros(sums.shape), where=max_distance > 0)
+
+
+def sweep_image(image_name, image_path, high_intensity_fractions, distance_ratio_thresholds, eccentricity_thresholds,
+                config):
+    """
+    Score every grid point of a classification-threshold sweep on one image.
+
+    Cells are filtered, classified and summarized as `process_image` does in `config["mode"]`:
+    the hull covers every recorded cell (Apical-in and Apical-out in "classify" mode, Apical-out
+    only in "count" mode), so each row has the hull columns of the image's Convex Hull Summary.
+
+    Parameters:
+        image_name (str): Title of the image.
+        image_path (str): Path to the image file.
+        high_intensity_fractions (list): Values of `high_intensity_fraction` to evaluate.
+        distance_ratio_thresholds (list): Values of `distance_ratio_threshold` to evaluate.
+        eccentricity_thresholds (list): Values of `eccentricity_threshold` to evaluate.
+        config (dict): Pipeline configuration providing the segmentation settings and the mode.
+
+    Returns:
+        rows (list): One dictionary per grid point with the counts and the hull summary of the recorded cells.
+    """
+    classify = config["mode"] == "classify"
+    features = cell_features(image_path, config)
+    ratios = distance_ratios(features, high_intensity_fractions)
+    passed_area = features["area"] >= features["min_cell_area"]
+    hull_vertices = {}
+
+    def recorded_hull(recorded):
+        # Grid points often record the same cells, so their hull vertices are computed once per selection
+        key = recorded.tobytes()
+        if key not in hull_vertices:
+            points = [features["hull_points"][i] for i in np.flatnonzero(recorded)]
+            hull_vertices[key] = _hull_points(np.concatenate(points)) if points else np.zeros((0, 2))
+        return hull_vertices[key]
+
+    rows = []
+    for (h, fraction), distance_threshold, eccentricity_threshold in itertools.product(
+            enumerate(high_intensity_fractions), distance_ratio_thresholds, eccentricity_thresholds):
+        passed = passed_area & (features["eccentricity"] >= eccentricity_threshold)
+        selected = {"Apical-out": passed & (ratios[h] < distance_threshold)}
+        selected["Apical-in"] = passed & ~selected["Apical-out"]
+        recorded = passed if classify else selected["Apical-out"]
+
+        class_counts = {cell_class: int(cells.sum()) for cell_class, cells in selected.items()}
+        class_areas = {cell_class: int(features["area"][cells].sum()) for cell_class, cells in selected.items()}
+        row = {
+            "Image Title": image_name,
+            "High Intensity Fraction": fraction,
+            "Distance Ratio Threshold": distance_threshold,
+            "Eccentricity Threshold": eccentricity_threshold,
+            "Apical-out Count": class_counts["Apical-out"]
+        }
+        if classify:
+            row["Apical-in Count"] = class_counts["Apical-in"]
+        try:
+            convex_hull_summary, _ = _hull_summary(image_name, recorded_hull(recorded), class_counts, class_areas,
+                                                   config)
+        except QhullError:
+            # Collinear cells have no hull area; `process_image` fails on such images
+            convex_hull_summary = {}
+        row.update(convex_hull_summary)
+        rows.append(row)
+    return rows
+
+
+def _sweep_one(task):
+    return sweep_image(*task)
+
+
+def run_sweep(image_files, high_intensity_fractions, distance_ratio_thresholds, eccentricity_thresholds, workers=1,
+              config=None):
+    """
+    Sweep classification thresholds over a batch of images.
+
+    Segmentation is shared by all grid points (and reused from the segmentation cache when
+    `cache_dir` is set), so only the vectorized per-cell scoring depends on the grid size.
+
+    Parameters:
+        image_files (dict): Mapping of image title to image path.
+        high_intensity_fractions (list): Values of `high_intensity_fraction` to evaluate.
+        distance_ratio_thresholds (list): Values of `distance_ratio_threshold` to evaluate.
+        eccentricity_thresholds (list): Values of `eccentricity_threshold` to evaluate.
+        workers (int): Number of worker processes (1 runs in the current process).
+        config (dict): Pipeline configuration providing the segmentation settings (None uses the defaults).
+
+    Returns:
+        df_sweep (DataFrame): One row per image and grid point.
+    """
+    config = load_config(**(config or {}))
+    tasks = [(image_name, image_path, list(high_intensity_fractions), list(distance_ratio_thresholds),
+              list(eccentricity_thresholds), config) for image_name, image_path in image_files.items()]
+    if workers == 1:
+        results = map(_sweep_one, tasks)
+        return pd.DataFrame([row for rows in results for row in rows])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return pd.DataFrame([row for rows in executor.map(_sweep_one, tasks) for row in rows])
+
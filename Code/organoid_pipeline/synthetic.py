@@ -0,0 +1,158 @@
+import numpy as np
+import tifffile
+from skimage import draw
+
+# Intensities of the synthetic ZO1-like stain (uint16 counts)
+BACKGROUND_LEVEL = 20
+BACKGROUND_NOISE = 5
+CELL_LEVEL = 120
+ZO1_LEVEL = 250
+
+# Cells sit on a jittered grid; the spacing leaves gaps wider than the disk(10) closing plus
+# the disk(3) dilation, so neighbouring cells are never merged by segmentation
+CELL_SPACING = 80
+CELL_JITTER = 4
+SEMI_MAJOR_RANGE = (14, 20)
+AXIS_RATIO_RANGE = (0.55, 0.75)
+
+
+def _cell_centers(size, rng):
+    # Grid positions inside the circular organoid, in random order
+    margin = CELL_SPACING // 2
+    grid = np.arange(margin, size - margin + 1, CELL_SPACING)
+    rows, cols = np.meshgrid(grid, grid, indexing="ij")
+    centers = np.column_stack((rows.ravel(), cols.ravel()))
+    radius = 0.45 * size
+    inside = np.hypot(centers[:, 0] - size / 2, centers[:, 1] - size / 2) <= radius
+    return rng.permutation(centers[inside])
+
+
+def max_cells(size):
+    """
+    Number of cells that fit in a synthetic organoid of the given size.
+
+    Parameters:
+        size (int): Image width and height in pixels.
+
+    Returns:
+        capacity (int): Largest valid `n_cells` for `make_organoid`.
+    """
+    return len(_cell_centers(size, np.random.default_rng(0)))
+
+
+def make_organoid(size=1024, n_cells=60, apical_out_fraction=0.5, seed=0):
+    """
+    Generate a synthetic ZO1-like organoid image with known Apical-in/out ground truth.
+
+    Each cell is an elongated ellipse of moderate intensity. Apical-out cells carry the
+    bright ZO1 signal on their outer boundary (low distance ratio), Apical-in cells in
+    their centre (high distance ratio), on a noisy dark background.
+
+    Parameters:
+        size (int): Image width and height in pixels (e.g. 512 up to 8192).
+        n_cells (int): Number of cells, at most `max_cells(size)`.
+        apical_out_fraction (float): Fraction of cells drawn as Apical-out.
+        seed (int): Seed of the random generator, so the same arguments give the same image.
+
+    Returns:
+        image (ndarray): uint16 image with shape (size, size).
+        truth (dict): "cells" (one dictionary per cell with its centre, axes, class and area),
+            "Apical-out Count", "Apical-in Count", "Apical-out Area" and "Apical-in Area".
+    """
+    rng = np.random.default_rng(seed)
+    centers = _cell_centers(size, rng)
+    if n_cells > len(centers):
+        raise ValueError(f"At most {len(centers)} cells fit in a {size}x{size} image, got n_cells={n_cells}.")
+
+    image = rng.standard_normal((size, size), dtype=np.float32)
+    image *= BACKGROUND_NOISE
+    image += BACKGROUND_LEVEL
+
+    n_apical_out = int(round(n_cells * apical_out_fraction))
+    classes = np.array(["Apical-out"] * n_apical_out + ["Apical-in"] * (n_cells - n_apical_out))
+    rng.shuffle(classes)
+
+    cells = []
+    for (row, col), cell_class in zip(centers[:n_cells], classes):
+        row, col = (row, col) + rng.integers(-CELL_JITTER, CELL_JITTER + 1, 2)
+        semi_major = rng.uniform(*SEMI_MAJOR_RANGE)
+        semi_minor = semi_major * rng.uniform(*AXIS_RATIO_RANGE)
+        rotation = rng.uniform(0, np.pi)
+
+        rr, cc = draw.ellipse(row, col, semi_minor, semi_major, (size, size), rotation=rotation)
+        if cell_class == "Apical-out":
+            # ZO1 ring along the cell boundary: a bright ellipse with a 2 px thinner cell body inside
+            image[rr, cc] = ZO1_LEVEL
+            inner_r, inner_c = draw.ellipse(row, col, semi_minor - 2, semi_major - 2, (size, size), rotation=rotation)
+            image[inner_r, inner_c] = CELL_LEVEL
+        else:
+            # ZO1 spot in the cell centre
+            image[rr, cc] = CELL_LEVEL
+            spot_r, spot_c = draw.ellipse(row, col, semi_minor / 3, semi_major / 3, (size, size), rotation=rotation)
+            image[spot_r, spot_c] = ZO1_LEVEL
+
+        cells.append({
+            "Row": int(row),
+            "Column": int(col),
+            "Semi-major Axis": float(semi_major),
+            "Semi-minor Axis": float(semi_minor),
+            "Classification": str(cell_class),
+            "Area": int(len(rr))
+        })
+
+    truth = {"cells": cells}
+    for cell_class in ("Apical-out", "Apical-in"):
+        truth[f"{cell_class} Count"] = sum(cell["Classification"] == cell_class for cell in cells)
+        truth[f"{cell_class} Area"] = sum(cell["Area"] for cell in cells if cell["Classification"] == cell_class)
+
+    return np.clip(image, 0, np.iinfo(np.uint16).max).astype(np.uint16), truth
+
+
+def write_organoid(path, size=1024, n_cells=60, apical_out_fraction=0.5, seed=0):
+    """
+    Generate a synthetic organoid with `make_organoid` and write it as an uncompressed TIFF.
+
+    Parameters:
+        path (str): Destination .tif path.
+        size (int): Image width and height in pixels.
+        n_cells (int): Number of cells.
+        apical_out_fraction (float): Fraction of cells drawn as Apical-out.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        truth (dict): Ground truth returned by `make_organoid`.
+    """
+    image, truth = make_organoid(size, n_cells, apical_out_fraction, seed)
+    tifffile.imwrite(path, image, photometric="minisblack")
+    return truth
+
+
+def make_small_cells(n_cells=10000, max_area=5, seed=0):
+    """
+    Generate a field of tiny cells, like the 1-5 px regions found by the smallest `min_cell_areas` passes.
+
+    Each cell is a horizontal run of 1 to `max_area` pixels with random intensities, on a grid
+    that keeps one background pixel between neighbouring cells.
+
+    Parameters:
+        n_cells (int): Number of cells.
+        max_area (int): Largest cell area in pixels.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        img_gray (ndarray): float32 intensity image in [0, 1].
+        labels (ndarray): int32 label image with one label per cell (1 to `n_cells`).
+    """
+    rng = np.random.default_rng(seed)
+    per_row = max(int(np.sqrt(n_cells * 2 / (max_area + 1))), 1)
+    n_rows = -(-n_cells // per_row)
+    labels = np.zeros((2 * n_rows, per_row * (max_area + 1)), dtype=np.int32)
+    img_gray = rng.uniform(0, 0.1, labels.shape).astype(np.float32)
+
+    areas = rng.integers(1, max_area + 1, n_cells)
+    for label, area in enumerate(areas, start=1):
+        row, col = divmod(label - 1, per_row)
+        cell = (2 * row, slice(col * (max_area + 1), col * (max_area + 1) + area))
+        labels[cell] = label
+        img_gray[cell] = rng.uniform(0.2, 1.0, area)
+    return img_gray, labels
@@ -0,0 +1,538 @@
+import os
+import tempfile
+from contextlib import ExitStack
+import numpy as np
+from scipy import ndimage as ndi
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from .image_loader import open_image, image_shape, project_window, to_gray
+from .morphology_backends import close_and_dilate
+from .feature_extraction import label_moments, moment_eccentricity
+from .histograms import gray_histogram, histogram_threshold
+from .segmentation import area_thresholds, label_dtype
+from .hull import hull_points, row_extremes
+from .profiling import stage
+from .batch import worker_pool
+
+# Final cells use the 8-connectivity of `measure.label`; hole filling and component areas the
+# 4-connectivity of `binary_fill_holes` and `ndi.label`
+EIGHT_CONNECTED = np.ones((3, 3), dtype=bool)
+EDT_HALO = 32    # First halo tried for the distance transform; doubled for tiles that need more
+OVERLAY_MAX_SIDE = 4096  # Longest side of the overlay preview kept in tiled mode; larger mosaics are subsampled
+
+
+def tile_windows(shape, tile_size):
+    """
+    Split an image into a grid of non-overlapping tiles.
+
+    Parameters:
+        shape (tuple): (rows, cols) of the image.
+        tile_size (int): Tile width and height in pixels (the last row and column of tiles may be smaller).
+
+    Returns:
+        windows (list): (row_start, row_stop, col_start, col_stop) per tile, in raster order.
+    """
+    return [(row, min(row + tile_size, shape[0]), col, min(col + tile_size, shape[1]))
+            for row in range(0, shape[0], tile_size) for col in range(0, shape[1], tile_size)]
+
+
+def _grow(window, halo, shape):
+    # Window grown by `halo` pixels on every side (clipped at the image border), and the
+    # slices of the original window inside it
+    row_start, row_stop, col_start, col_stop = window
+    grown = (max(row_start - halo, 0), min(row_stop + halo, shape[0]),
+             max(col_start - halo, 0), min(col_stop + halo, shape[1]))
+    core = (slice(row_start - grown[0], row_stop - grown[0]), slice(col_start - grown[2], col_stop - grown[2]))
+    return grown, core
+
+
+def _slices(window):
+    return slice(window[0], window[1]), slice(window[2], window[3])
+
+
+def _gray(state, window):
+    # float32 grayscale of a window, normalized like the whole image
+    data, rgb = open_image(state["image_path"], state["work_dir"])
+    rows, cols = _slices(window)
+    projected = project_window(data, rgb, rows, cols, state["projection"])
+    return to_gray(projected, rgb, state["scale"])
+
+
+def _array(state, name):
+    return np.load(os.path.join(state["work_dir"], f"{name}.npy"), mmap_mode="r+")
+
+
+def _lookup(state, name):
+    return np.load(os.path.join(state["work_dir"], f"{name}.npy"), mmap_mode="r")
+
+
+def _border_ids(labels, window, shape):
+    # Labels on the sides of the tile that lie on the image border
+    sides = []
+    if window[0] == 0:
+        sides.append(labels[0])
+    if window[1] == shape[0]:
+        sides.append(labels[-1])
+    if window[2] == 0:
+        sides.append(labels[:, 0])
+    if window[3] == shape[1]:
+        sides.append(labels[:, -1])
+    ids = np.unique(np.concatenate(sides)) if sides else np.zeros(0, dtype=labels.dtype)
+    return ids[ids > 0]
+
+
+# -------- Tile Tasks (run in worker processes) --------
+def _max_task(args):
+    state, window, _ = args
+    data, rgb = open_image(state["image_path"], state["work_dir"])
+    return project_window(data, rgb, *_slices(window), state["projection"]).max()
+
+
+def _histogram_task(args):
+    state, window, _ = args
+    return gray_histogram(_gray(state, window), state["histogram_bins"])
+
+
+def _background_task(args):
+    # Threshold the tile and label its background (4-connected)
+    state, window, _ = args
+    binary = _gray(state, window) > state["thresh"]
+    _array(state, "mask")[_slices(window)] = binary
+    background, n_background = ndi.label(~binary, output=np.uint32)
+    _array(state, "labels")[_slices(window)] = background
+    return n_background, _border_ids(background, window, state["shape"])
+
+
+def _fill_task(args):
+    # Fill the holes (background not connected to the image border) and label the foreground
+    state, window, offset = args
+    rows, cols = _slices(window)
+    filled = np.array(_array(state, "mask")[rows, cols])
+    background = np.array(_array(state, "labels")[rows, cols])
+    holes = (background > 0) & ~_lookup(state, "outside")[background.astype(np.int64) + offset]
+    filled |= holes
+    _array(state, "mask")[rows, cols] = filled
+    components, n_components = ndi.label(filled, output=np.uint32)
+    _array(state, "labels")[rows, cols] = components
+    return n_components, np.bincount(components.ravel(), minlength=n_components + 1)[1:]
+
+
+def _threshold_task(args):
+    # Per-pixel minimum cell area threshold of the stitched components
+    state, window, offset = args
+    rows, cols = _slices(window)
+    components = np.asarray(_array(state, "labels")[rows, cols], dtype=np.int64)
+    thresholds = _lookup(state, "component_thresholds")
+    _array(state, "thresholds")[rows, cols] = np.where(components > 0, thresholds[components + offset], 0)
+    return None
+
+
+def _morphology_task(args):
+    # Closing and dilation on the tile grown by the structuring elements' reach
+    state, window, _ = args
+    grown, core = _grow(window, state["morphology_halo"], state["shape"])
+    cleaned = _array(state, "thresholds")[_slices(grown)] > 0
+    dilated = close_and_dilate(cleaned, state["closing_radius"], state["dilation_radius"],
+                               state["morphology_backend"])
+    _array(state, "mask")[_slices(window)] = dilated[core]
+    return None
+
+
+def _label_task(args):
+    # Label the final cells (8-connected), with their first pixel and largest threshold
+    state, window, _ = args
+    rows, cols = _slices(window)
+    labels, n_labels = ndi.label(_array(state, "mask")[rows, cols], structure=EIGHT_CONNECTED, output=np.uint32)
+    _array(state, "labels")[rows, cols] = labels
+    thresholds = np.asarray(_array(state, "thresholds")[rows, cols])
+
+    # ndi.label numbers in raster order, so each label's first pixel is its first occurrence
+    flat_labels = labels.ravel()
+    present, first = np.unique(flat_labels, return_index=True)
+    first_rows, first_cols = np.divmod(first[present > 0], labels.shape[1])
+    first_index = (first_rows + window[0]).astype(np.int64) * state["shape"][1] + first_cols + window[2]
+
+    label_thresholds = np.zeros(n_labels + 1, dtype=thresholds.dtype)
+    cleaned = thresholds > 0
+    np.maximum.at(label_thresholds, labels[cleaned], thresholds[cleaned])
+    return n_labels, first_index, label_thresholds[1:]
+
+
+def _final_labels(state, window, offset):
+    local = np.asarray(_array(state, "labels")[_slices(window)], dtype=np.int64)
+    return np.where(local > 0, _lookup(state, "final_labels")[local + offset], 0)
+
+
+def _moments_task(args):
+    # Pixel count, centroid, centered second moments and maximum intensity per cell in the tile
+    state, window, offset = args
+    labels = _final_labels(state, window, offset)
+    foreground = labels > 0
+    if not np.any(foreground):
+        return None
+    img_gray = _gray(state, window)
+    present, inverse = np.unique(labels[foreground], return_inverse=True)
+    rows, cols = np.nonzero(foreground)
+    rows = rows + window[0]
+    cols = cols + window[2]
+
+    n, means, moments = label_moments(inverse, rows, cols)
+    max_intensity = np.full(len(present), -np.inf, dtype=img_gray.dtype)
+    np.maximum.at(max_intensity, inverse, img_gray[foreground])
+    return present, n, means, moments, max_intensity
+
+
+def _distance_task(args):
+    # Distance transform of the cells on the tile grown until every distance is exact, then
+    # the maximum distance and the high-intensity distance sums per cell
+    state, window, offset = args
+    labels = _final_labels(state, window, offset)
+    foreground = labels > 0
+    if not np.any(foreground):
+        return None
+
+    shape = state["shape"]
+    halo = EDT_HALO
+    while True:
+        grown, core = _grow(window, halo, shape)
+        dist_transform = ndi.distance_transform_edt(_array(state, "mask")[_slices(grown)])[core]
+        # A distance is exact when no pixel outside the grown window could be closer than it
+        row_margin = np.minimum(
+            np.arange(window[0], window[1]) - grown[0] if grown[0] > 0 else np.inf,
+            grown[1] - 1 - np.arange(window[0], window[1]) if grown[1] < shape[0] else np.inf)
+        col_margin = np.minimum(
+            np.arange(window[2], window[3]) - grown[2] if grown[2] > 0 else np.inf,
+            grown[3] - 1 - np.arange(window[2], window[3]) if grown[3] < shape[1] else np.inf)
+        margin = np.minimum(np.broadcast_to(row_margin, (window[3] - window[2], window[1] - window[0])).T, col_margin)
+        if np.all(dist_transform[foreground] <= margin[foreground]):
+            break
+        halo *= 2
+
+    img_gray = _gray(state, window)
+    present, inverse = np.unique(labels[foreground], return_inverse=True)
+    cell_distance = dist_transform[foreground]
+    max_distance = np.zeros(len(present))
+    np.maximum.at(max_distance, inverse, cell_distance)
+
+    max_intensity = _lookup(state, "max_intensity")
+    high = img_gray[foreground] > state["high_intensity_fraction"] * max_intensity[present][inverse]
+    high_sum = np.bincount(inverse[high], weights=cell_distance[high], minlength=len(present))
+    high_count = np.bincount(inverse[high], minlength=len(present))
+    return present, max_distance, high_sum, high_count
+
+
+def _hull_task(args):
+    # Hull candidates of the recorded cells, and the subsampled overlay preview of the tile
+    state, window, offset = args
+    labels = _final_labels(state, window, offset)
+    recorded = _lookup(state, "label_classes")[labels] > 0
+    points = hull_points(recorded) + (window[0], window[2])
+
+    preview = None
+    step = state["preview_step"]
+    if step is not None:
+        # Pixels on the global grid of every `step`-th row and column
+        first_row, first_col = -window[0] % step, -window[2] % step
+        preview = (labels[first_row::step, first_col::step],
+                   _gray(state, window)[first_row::step, first_col::step])
+    return points, preview
+
+
+# -------- Stitching --------
+def _seam_ids(state, windows, offsets, axis, position):
+    # Global labels of one full image row (axis 0) or column (axis 1) across every tile
+    shape = state["shape"]
+    ids = np.zeros(shape[1 - axis], dtype=np.int64)
+    labels = _lookup(state, "labels")
+    for window, offset in zip(windows, offsets):
+        start, stop = window[2 * axis], window[2 * axis + 1]
+        if not start <= position < stop:
+            continue
+        other = slice(window[2 - 2 * axis], window[3 - 2 * axis])
+        local = np.asarray(labels[position, other] if axis == 0 else labels[other, position], dtype=np.int64)
+        ids[other] = np.where(local > 0, local + offset, 0)
+    return ids
+
+
+def _stitch(state, windows, offsets, n_total, diagonal):
+    # Merge labels that touch across tile seams; returns the merged group of every global label
+    edges = []
+    for axis in (0, 1):
+        for seam in sorted({window[2 * axis] for window in windows} - {0}):
+            before = _seam_ids(state, windows, offsets, axis, seam - 1)
+            after = _seam_ids(state, windows, offsets, axis, seam)
+            pairs = [(before, after)]
+            if diagonal:
+                pairs += [(before[:-1], after[1:]), (before[1:], after[:-1])]
+            for a, b in pairs:
+                touching = (a > 0) & (b > 0)
+                edges.append(np.column_stack((a[touching], b[touching])))
+    edges = np.concatenate(edges) if edges else np.zeros((0, 2), dtype=np.int64)
+    graph = coo_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n_total + 1, n_total + 1))
+    _, groups = connected_components(graph, directed=False)
+    return groups
+
+
+def tile_workers(config):
+    """
+    Number of worker processes for the tiles of one image.
+
+    Parameters:
+        config (dict): Pipeline configuration from `load_config`.
+
+    Returns:
+        workers (int): `config["tile_workers"]`, or by default the cores left to each image worker
+            (every core when images run one at a time, 1 when `workers` is None and images use every core).
+    """
+    if config["tile_workers"] is not None:
+        return config["tile_workers"]
+    cpu_count = os.cpu_count() or 1
+    return max(1, cpu_count // (config["workers"] or cpu_count))
+
+
+def _offsets(counts):
+    return np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+
+
+class TiledImage:
+    """
+    Segment and measure an image in tiles, for stitched mosaics too large to process as one frame.
+
+    Every stage that is global on the whole image is made exact across tiles: the Otsu threshold
+    comes from a histogram accumulated tile by tile, holes, component areas and cells are
+    stitched across tile seams, the closing/dilation runs on tiles grown by the structuring
+    elements' reach, and the distance transform on tiles grown until every distance is exact.
+    Intermediate masks and labels are memory-mapped files in a temporary directory, so memory
+    use is bounded by the tile size. Use as a context manager.
+
+    Parameters:
+        image_path (str): Path to the image file (uncompressed TIFFs are memory-mapped, others decoded once
+            into the temporary directory).
+        config (dict): Pipeline configuration from `load_config`, with "tile_size" set.
+    """
+
+    def __init__(self, image_path, config):
+        self.image_path = image_path
+        self.config = config
+        self.windows = None
+        self.offsets = None
+        self._work_dir = None
+        self._pool = None
+        self._executor = None
+
+    def __enter__(self):
+        self._work_dir = tempfile.TemporaryDirectory(prefix="organoid_tiles_")
+        workers = tile_workers(self.config)
+        # Compressed images are decoded once into the work directory, not once per tile
+        data, self.rgb = open_image(self.image_path, self._work_dir.name)
+        self.shape = tuple(int(size) for size in image_shape(data, self.rgb))
+        del data
+        self.windows = tile_windows(self.shape, self.config["tile_size"])
+        if workers > 1 and len(self.windows) > 1:
+            # Tile workers cap their BLAS/OpenMP/OpenCV threads like the image workers do
+            self._pool = ExitStack()
+            self._executor = self._pool.enter_context(
+                worker_pool(min(workers, len(self.windows)), self.config["threads_per_worker"]))
+        self.state = {
+            "image_path": self.image_path,
+            "work_dir": self._work_dir.name,
+            "shape": self.shape,
+            "projection": self.config["projection"],
+            "scale": None,
+            "closing_radius": self.config["closing_radius"],
+            "dilation_radius": self.config["dilation_radius"],
+            "morphology_backend": self.config["morphology_backend"],
+            # A closing reaches twice its radius, the dilation once more
+            "morphology_halo": 2 * self.config["closing_radius"] + self.config["dilation_radius"],
+            "high_intensity_fraction": self.config["high_intensity_fraction"],
+            "preview_step": None
+        }
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._executor is not None:
+            self._pool.close()
+        self._work_dir.cleanup()
+
+    def _map(self, task, offsets=None):
+        # Run a tile task on every tile, with the label offset of each tile from the previous round
+        offsets = [0] * len(self.windows) if offsets is None else offsets
+        tasks = [(self.state, window, offset) for window, offset in zip(self.windows, offsets)]
+        if self._executor is None:
+            return [task(args) for args in tasks]
+        return list(self._executor.map(task, tasks))
+
+    def _save(self, name, array):
+        np.save(os.path.join(self._work_dir.name, f"{name}.npy"), array)
+
+    def _create(self, name, dtype):
+        np.lib.format.open_memmap(os.path.join(self._work_dir.name, f"{name}.npy"), mode="w+",
+                                  dtype=dtype, shape=self.shape)
+
+    def otsu_threshold(self, compute=True):
+        """
+        Otsu threshold of the whole image from a fixed-bin histogram accumulated tile by tile.
+
+        Parameters:
+            compute (bool): False only scans the maximum single-channel tiles are normalized by.
+
+        Returns:
+            thresh (float): Same value as `segmentation.otsu_threshold` on the whole grayscale image (None if not computed).
+        """
+        if not self.rgb:
+            # Single-channel images are divided by their maximum, as in `to_gray`; RGB frames by their dtype
+            self.state["scale"] = np.max(self._map(_max_task))
+        if not compute:
+            return None
+
+        self.state["histogram_bins"] = self.config["histogram_bins"]
+        return histogram_threshold(np.sum(self._map(_histogram_task), axis=0))
+
+    def segment(self, thresh=None):
+        """
+        Threshold, fill, clean, close/dilate and label the whole image tile by tile (see `segment_cells`).
+
+        Parameters:
+            thresh (float): Threshold to use instead of the image's own Otsu threshold (e.g. a plate threshold).
+
+        Returns:
+            thresh (float): Otsu threshold value.
+            n_labels (int): Number of cells, numbered as `segment_cells` numbers them.
+            region_thresholds (ndarray): min_cell_area threshold attributed to each label (entry 0 is unused).
+        """
+        config = self.config
+        with stage("otsu"):
+            image_thresh = self.otsu_threshold(compute=thresh is None)
+            thresh = image_thresh if thresh is None else thresh
+        self.state["thresh"] = thresh
+        self._create("mask", bool)
+        self._create("labels", np.uint32)
+
+        # Holes are background components that do not reach the image border
+        with stage("fill"):
+            results = self._map(_background_task)
+            counts = [n for n, _ in results]
+            offsets = _offsets(counts)
+            groups = _stitch(self.state, self.windows, offsets, int(np.sum(counts)), diagonal=False)
+            border = np.concatenate([ids.astype(np.int64) + offset for (_, ids), offset in zip(results, offsets)])
+            outside = np.isin(groups, groups[border])
+            outside[0] = True
+            self._save("outside", outside)
+            results = self._map(_fill_task, offsets)
+
+        # Component areas are summed across seams before the min_cell_area thresholds
+        with stage("segmentation"):
+            counts = [n for n, _ in results]
+            offsets = _offsets(counts)
+            groups = _stitch(self.state, self.windows, offsets, int(np.sum(counts)), diagonal=False)
+            sizes = np.concatenate([np.zeros(1, dtype=np.int64)] + [sizes for _, sizes in results])
+            areas = np.bincount(groups, weights=sizes).astype(np.int64)
+            component_thresholds = area_thresholds(areas, config["min_cell_areas"])
+            threshold_dtype = np.min_scalar_type(max(config["min_cell_areas"]))
+            self._save("component_thresholds", component_thresholds[groups].astype(threshold_dtype))
+            self._create("thresholds", threshold_dtype)
+            self._map(_threshold_task, offsets)
+
+        with stage("morphology"):
+            self._map(_morphology_task, offsets)
+
+        # Cells are numbered by decreasing threshold, then by the raster position of their first pixel
+        with stage("labeling"):
+            results = self._map(_label_task, offsets)
+            counts = [n for n, _, _ in results]
+            offsets = _offsets(counts)
+            groups = _stitch(self.state, self.windows, offsets, int(np.sum(counts)), diagonal=True)
+            n_groups = int(groups.max()) + 1
+            first_index = np.full(n_groups, np.iinfo(np.int64).max)
+            np.minimum.at(first_index, groups[1:], np.concatenate([np.zeros(0, dtype=np.int64)] + [first for _, first, _ in results]))
+            group_thresholds = np.zeros(n_groups, dtype=component_thresholds.dtype)
+            np.maximum.at(group_thresholds, groups[1:],
+                          np.concatenate([np.zeros(0, dtype=threshold_dtype)] + [t for _, _, t in results]))
+            cells = np.setdiff1d(np.arange(n_groups), [groups[0]])
+            order = cells[np.lexsort((first_index[cells], -group_thresholds[cells]))]
+            final = np.zeros(n_groups, dtype=np.int64)
+            final[order] = np.arange(1, len(order) + 1)
+            self._save("final_labels", final[groups])
+
+        self.offsets = offsets
+        self.n_labels = len(order)
+        region_thresholds = np.zeros(self.n_labels + 1, dtype=component_thresholds.dtype)
+        region_thresholds[1:] = group_thresholds[order]
+        return thresh, self.n_labels, region_thresholds
+
+    def region_table(self):
+        """
+        Area, eccentricity and distance ratio of every cell, merged across tiles (see `feature_extraction.region_table`).
+
+        Returns:
+            table (dict): Arrays "label", "area", "eccentricity" and "distance_ratio", one entry per cell in label order.
+        """
+        n_labels = self.n_labels
+        n = np.zeros(n_labels + 1)
+        means = np.zeros((n_labels + 1, 2))
+        moments = np.zeros((n_labels + 1, 3))
+        max_intensity = np.full(n_labels + 1, -np.inf, dtype=np.float32)
+        for result in self._map(_moments_task, self.offsets):
+            if result is None:
+                continue
+            present, tile_n, tile_means, tile_moments, tile_max = result
+            # Combine centered moments of the tiles (parallel variance formula)
+            total = n[present] + tile_n
+            delta = tile_means - means[present]
+            weight = (n[present] * tile_n / total)[:, np.newaxis]
+            moments[present] += tile_moments + weight * np.column_stack(
+                (delta[:, 0] ** 2, delta[:, 1] ** 2, delta[:, 0] * delta[:, 1]))
+            means[present] += delta * (tile_n / total)[:, np.newaxis]
+            n[present] = total
+            max_intensity[present] = np.maximum(max_intensity[present], tile_max)
+        self._save("max_intensity", max_intensity)
+
+        max_distance = np.zeros(n_labels + 1)
+        high_sum = np.zeros(n_labels + 1)
+        high_count = np.zeros(n_labels + 1)
+        for result in self._map(_distance_task, self.offsets):
+            if result is None:
+                continue
+            present, tile_max_distance, tile_high_sum, tile_high_count = result
+            max_distance[present] = np.maximum(max_distance[present], tile_max_distance)
+            high_sum[present] += tile_high_sum
+            high_count[present] += tile_high_count
+
+        mean_distance_high = np.divide(high_sum, high_count, out=np.zeros(n_labels + 1), where=high_count > 0)
+        ratios = np.divide(mean_distance_high, max_distance, out=np.zeros(n_labels + 1), where=max_distance > 0)
+        return {
+            "label": np.arange(1, n_labels + 1),
+            "area": n[1:],
+            "eccentricity": moment_eccentricity(n[1:], moments[1:]),
+            "distance_ratio": ratios[1:]
+        }
+
+    def hull_points(self, label_classes, preview_step=None):
+        """
+        Hull candidates of the recorded cells, and optionally a subsampled overlay preview.
+
+        Parameters:
+            label_classes (ndarray): Class code per label (0 = not recorded).
+            preview_step (int): Keep every `preview_step`-th row and column for the overlay (None skips it).
+
+        Returns:
+            points (ndarray): Same (row, col) points as `hull_points` on the whole recorded mask.
+            preview (tuple): Subsampled label image and grayscale image, or None.
+        """
+        self._save("label_classes", label_classes)
+        self.state["preview_step"] = preview_step
+        results = self._map(_hull_task, self.offsets)
+        points = row_extremes(np.concatenate([points for points, _ in results]))
+
+        preview = None
+        if preview_step is not None:
+            preview_shape = (-(-self.shape[0] // preview_step), -(-self.shape[1] // preview_step))
+            preview_labels = np.zeros(preview_shape, dtype=label_dtype(self.n_labels))
+            preview_gray = np.zeros(preview_shape, dtype=np.float32)
+            for window, (_, (labels, img_gray)) in zip(self.windows, results):
+                rows = slice(-(-window[0] // preview_step), -(-window[0] // preview_step) + labels.shape[0])
+                cols = slice(-(-window[2] // preview_step), -(-window[2] // preview_step) + labels.shape[1])
+                preview_labels[rows, cols] = labels
+                preview_gray[rows, cols] = img_gray
+            preview = (preview_labels, preview_gray)
+        return points, preview
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+import pandas as pd
+from .batch import image_task, run_task, worker_pool
+from .cache import file_digest
+from .pipeline import summary_statistics
+from .profiling import write_log
+from .results_store import read_table, result_settings, write_json, write_image_results, write_failure, write_workbook
+
+IMAGE_EXTENSIONS = (".tif", ".tiff")
+MANIFEST_NAME = "watch_manifest.json"
+
+
+class FolderWatcher:
+    """
+    Watch a folder and analyse every new image as soon as the microscope has finished writing it.
+
+    The folder is polled every `config["poll_interval"]` seconds. A file is queued once its size and
+    modification time are unchanged between two polls, and skipped when its content hash is
+    already in the manifest (`watch_manifest.json` in the output directory), so restarts, renamed
+    files and copies are never processed twice. At most `2 * workers` images are in the pool at a
+    time. Finished images go to the result store as they complete. Only the per-image summary rows
+    are kept in memory; the workbook is rewritten with them and the Cell Data read back from the
+    store once the queue drains and on shutdown: an image acquired on its own is in the workbook
+    right after it finishes, and a backlog costs one workbook write rather than one per image.
+
+    Parameters:
+        pipeline (Pipeline): Configured pipeline; its output_dir holds the store, manifest and workbook.
+        watch_dir (str): Folder the microscope writes images to.
+    """
+
+    def __init__(self, pipeline, watch_dir):
+        config = pipeline.config
+        if config["otsu_source"] == "plate" and config["otsu_threshold"] is None:
+            # Control wells arrive one by one, so the plate threshold has to be known up front
+            raise ValueError("Watching with otsu_source='plate' needs otsu_threshold (see Pipeline.plate_thresholds).")
+        self.pipeline = pipeline
+        self.watch_dir = os.path.expanduser(watch_dir)
+        self.output_path = os.path.expanduser(config["output_dir"])
+        self.store_dir = os.path.join(self.output_path, "cell_analysis_results")
+        self.manifest_path = os.path.join(self.output_path, MANIFEST_NAME)
+        self.workers = config["workers"] or os.cpu_count() or 1
+        os.makedirs(self.output_path, exist_ok=True)
+
+        self.manifest = self._read_manifest()
+        # path -> (size, mtime) seen on the last poll, and files already handled at that (size, mtime)
+        self._last_stat = {}
+        self._handled = {}
+        self._queue = deque()
+        self._queued_digests = set()
+        self._failed = {}
+
+        # Convex Hull Summary row per image in the manifest, in processing order
+        image_names = [entry["image_name"] for entry in self.manifest["images"].values()]
+        self.summaries = {row["Image Title"]: row
+                          for row in read_table(self.store_dir, "summary", image_names).to_dict("records")}
+
+    def _read_manifest(self):
+        settings = result_settings(self.pipeline.config)
+        if not os.path.exists(self.manifest_path):
+            return {"settings": settings, "images": {}}
+        with open(self.manifest_path) as handle:
+            manifest = json.load(handle)
+        if manifest["settings"] != settings:
+            raise ValueError(f"{self.manifest_path} was written with other analysis settings "
+                             f"({manifest['settings']}); use another output_dir.")
+        return manifest
+
+    def poll(self):
+        """
+        Scan the folder once and queue the images that finished writing since the last poll.
+
+        Returns:
+            n_queued (int): Number of images added to the queue.
+        """
+        n_queued = 0
+        current = {}
+        for entry in os.scandir(self.watch_dir):
+            if not entry.is_file() or not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            stat = entry.stat()
+            current[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            # Files still being written change between polls
+            if self._last_stat.get(entry.path) != current[entry.path] or \
+                    self._handled.get(entry.path) == current[entry.path]:
+                continue
+            self._handled[entry.path] = current[entry.path]
+
+            digest = file_digest(entry.path)
+            if digest in self.manifest["images"] or digest in self._queued_digests or digest in self._failed:
+                continue
+            image_name = os.path.splitext(entry.name)[0]
+            self._queue.append((image_name, entry.path, digest))
+            self._queued_digests.add(digest)
+            n_queued += 1
+        self._last_stat = current
+        return n_queued
+
+    def _record(self, digest, image_name, image_path, result, error, profile):
+        # Store one finished image and keep its summary row for the workbook
+        config = self.pipeline.config
+        if config["profile_log"] is not None:
+            write_log(os.path.join(self.output_path, config["profile_log"]), profile)
+        if error is not None:
+            print(f"{image_name} - Failed:\n{error}")
+            write_failure(self.store_dir, image_name, image_path, error)
+            # The store no longer holds earlier results under this title
+            self.summaries.pop(image_name, None)
+            self._failed[digest] = {"Image Title": image_name, "Image Path": image_path, "Error": error}
+            return
+
+        cell_data, convex_summary = result
+        write_image_results(self.store_dir, image_name, cell_data, convex_summary)
+        # A new file with the title of an earlier one replaces its results
+        self.manifest["images"] = {other: entry for other, entry in self.manifest["images"].items()
+                                   if entry["image_name"] != image_name}
+        self.manifest["images"][digest] = {"image_name": image_name, "image_path": image_path,
+                                           "processed_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        write_json(self.manifest_path, self.manifest)
+        self._failed = {other: failure for other, failure in self._failed.items()
+                        if failure["Image Title"] != image_name}
+
+        self.summaries.pop(image_name, None)
+        self.summaries[image_name] = convex_summary
+        print(f"Processed {image_name} (peak memory {convex_summary['Peak Memory (MB)']} MB)")
+
+    def export(self):
+        """
+        Rewrite the workbook from the in-memory summary rows and the Cell Data in the store.
+
+        Returns:
+            output_excel_path (str): Path of the written workbook.
+        """
+        output_excel_path = os.path.join(self.output_path, self.pipeline.config["workbook_name"])
+        df_cells = read_table(self.store_dir, "cells", list(self.summaries))
+        write_workbook(output_excel_path, df_cells, pd.DataFrame(list(self.summaries.values())),
+                       pd.DataFrame(list(self._failed.values())),
+                       summarize=summary_statistics if self.pipeline.mode == "classify" else None)
+        return output_excel_path
+
+    def run(self, once=False):
+        """
+        Poll the folder and process new images until interrupted (Ctrl+C), which lets the images
+        in progress finish.
+
+        Parameters:
+            once (bool): Process the images present now and return instead of watching.
+
+        Returns:
+            n_processed (int): Number of images processed (including failures).
+        """
+        config = self.pipeline.config
+        overlay_dir = self.output_path if config["render_overlays"] else None
+        in_flight = {}
+        n_processed = 0
+        # Images recorded since the workbook was last written
+        unexported = 0
+        print(f"Watching {self.watch_dir} ({len(self.manifest['images'])} images already processed) ...")
+
+        with worker_pool(self.workers, config["threads_per_worker"], ignore_interrupt=True) as executor:
+            try:
+                while True:
+                    self.poll()
+                    # Keep the pool busy without queueing the whole folder in it
+                    while self._queue and len(in_flight) < 2 * self.workers:
+                        image_name, image_path, digest = self._queue.popleft()
+                        task = image_task(self.pipeline.process_image, image_name, image_path,
+                                          overlay_dir=overlay_dir, overlay_scale=config["overlay_scale"])
+                        in_flight[executor.submit(run_task, task)] = digest
+
+                    if not in_flight:
+                        # The queue has drained: bring the workbook up to date while waiting
+                        if unexported:
+                            self.export()
+                            unexported = 0
+                        # Files seen for the first time are queued on the next poll
+                        if once and self._last_stat.keys() <= self._handled.keys():
+                            break
+                        if not once:
+                            time.sleep(config["poll_interval"])
+                        continue
+
+                    done, _ = wait(in_flight, timeout=config["poll_interval"], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        digest = in_flight.pop(future)
+                        self._queued_digests.discard(digest)
+                        self._record(digest, *future.result())
+                        n_processed += 1
+                        unexported += 1
+            except KeyboardInterrupt:
+                # Images that have not started are picked up again on the next start
+                for future in in_flight:
+                    future.cancel()
+                running = {future: digest for future, digest in in_flight.items() if not future.cancelled()}
+                print(f"Stopping after the {len(running)} image(s) in progress ...")
+                for future, digest in running.items():
+                    self._record(digest, *future.result())
+                    n_processed += 1
+                    unexported += 1
+                if unexported:
+                    self.export()
+        return n_processed
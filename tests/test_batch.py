@@ -0,0 +1,27 @@
+import os
+import pytest
+from organoid_pipeline.batch import WORKER_DIED, iter_batch
+
+
+def _process(image_name, image_path):
+    # Module level, so worker processes can unpickle it; "crash" kills its worker outright
+    if image_name == "crash":
+        os._exit(137)
+    if image_name == "error":
+        raise ValueError("unreadable image")
+    return [{"Image Title": image_name}], {"Path": image_path}, {"hull_vertices": None}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2])
+def test_dead_worker_fails_only_its_image(chunk_size):
+    names = ["a", "b", "crash", "c", "error", "d", "e", "f"]
+    results = list(iter_batch(_process, {name: f"{name}.tif" for name in names}, workers=2, chunk_size=chunk_size))
+
+    assert [image_name for image_name, *_ in results] == names
+    errors = {image_name: error for image_name, _, _, error, _ in results}
+    assert errors.pop("crash") == WORKER_DIED
+    assert "unreadable image" in errors.pop("error")
+    # Images lost with the dead worker are rerun
+    assert all(error is None for error in errors.values())
+    cell_data = {image_name: result[0] for image_name, _, result, _, _ in results if image_name in errors}
+    assert cell_data == {image_name: [{"Image Title": image_name}] for image_name in errors}
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from scipy import ndimage as ndi
+from skimage import measure
+from organoid_pipeline.feature_extraction import padded_slice, distance_ratio, batch_distance_ratios, region_table
+from organoid_pipeline.kernels import HAVE_NUMBA
+
+
+def _reference_ratio(labels, label, img_gray, high_intensity_fraction):
+    # Original implementation: distance transform of the region on the full frame
+    cell_mask = labels == label
+    dist_transform = ndi.distance_transform_edt(cell_mask)
+    max_distance = np.max(dist_transform)
+    cell_intensity = img_gray[cell_mask]
+    intensity_threshold = high_intensity_fraction * np.max(cell_intensity)
+    high_intensity_mask = np.zeros_like(cell_mask, dtype=bool)
+    high_intensity_mask[cell_mask] = cell_intensity > intensity_threshold
+    mean_distance_high = np.mean(dist_transform[high_intensity_mask]) if np.sum(high_intensity_mask) > 0 else 0
+    return mean_distance_high / max_distance if max_distance > 0 else 0
+
+
+def _random_cells(seed, shape=(120, 160)):
+    # Blobs of many sizes, several cut by the image border, with a random intensity image
+    rng = np.random.default_rng(seed)
+    mask = ndi.gaussian_filter(rng.random(shape), 3) > 0.52
+    mask |= rng.random(shape) > 0.995
+    # Regions covering a corner and a full edge
+    mask[:7, :9] = True
+    mask[-3:, 20:60] = True
+    labels = measure.label(mask)
+    img_gray = rng.random(shape).astype(np.float32)
+    return labels, img_gray
+
+
+def test_padded_slice_clips_at_border():
+    assert padded_slice((0, 3, 5, 10), (8, 10)) == (slice(0, 6), slice(2, 10))
+    assert padded_slice((2, 3, 4, 5), (8, 10), pad=2) == (slice(0, 6), slice(1, 7))
+
+
+def test_border_regions_present():
+    labels, _ = _random_cells(0)
+    border_labels = np.unique(np.concatenate([labels[0], labels[-1], labels[:, 0], labels[:, -1]]))
+    assert len(border_labels[border_labels > 0]) >= 3
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("high_intensity_fraction", [0.5, 0.9])
+def test_distance_ratio_matches_full_frame(seed, high_intensity_fraction):
+    labels, img_gray = _random_cells(seed)
+    for region in measure.regionprops(labels):
+        ratio, cell_slice, cell_mask = distance_ratio(labels, region, img_gray, high_intensity_fraction,
+                                                      use_numba=False)
+        assert ratio == pytest.approx(_reference_ratio(labels, region.label, img_gray, high_intensity_fraction),
+                                      rel=1e-12, abs=1e-15)
+        assert np.array_equal(cell_mask, labels[cell_slice] == region.label)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_batch_distance_ratios_match_full_frame(seed):
+    labels, img_gray = _random_cells(seed)
+    ratios = batch_distance_ratios(labels, img_gray, 0.7, use_numba=False)
+    reference = [_reference_ratio(labels, label, img_gray, 0.7) for label in range(1, labels.max() + 1)]
+    np.testing.assert_allclose(ratios[1:], reference, rtol=1e-12, atol=1e-15)
+
+
+@pytest.mark.skipif(not HAVE_NUMBA, reason="numba is not installed")
+def test_numba_kernels_match_numpy():
+    labels, img_gray = _random_cells(3)
+    np.testing.assert_allclose(batch_distance_ratios(labels, img_gray, 0.7, use_numba=True),
+                               batch_distance_ratios(labels, img_gray, 0.7, use_numba=False), rtol=1e-12)
+    for region in measure.regionprops(labels):
+        assert distance_ratio(labels, region, img_gray, 0.7, use_numba=True)[0] == pytest.approx(
+            distance_ratio(labels, region, img_gray, 0.7, use_numba=False)[0], rel=1e-12, abs=1e-15)
+
+
+def test_batch_distance_ratios_without_cells():
+    labels = np.zeros((5, 5), dtype=np.int32)
+    assert np.array_equal(batch_distance_ratios(labels, np.zeros((5, 5), dtype=np.float32), 0.7), [0])
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_region_table_matches_regionprops(seed):
+    labels, img_gray = _random_cells(seed)
+    table = region_table(labels, img_gray, 0.7)
+    reference = measure.regionprops_table(labels, properties=("label", "area", "eccentricity"))
+    assert np.array_equal(table["label"], reference["label"])
+    assert np.array_equal(table["area"], reference["area"])
+    np.testing.assert_allclose(table["eccentricity"], reference["eccentricity"], rtol=0, atol=1e-9)
+    np.testing.assert_allclose(table["distance_ratio"],
+                               [_reference_ratio(labels, label, img_gray, 0.7) for label in reference["label"]],
+                               rtol=1e-12, atol=1e-15)
@@ -0,0 +1,22 @@
+from organoid_pipeline.config import load_config
+from organoid_pipeline.histograms import plate_thresholds
+from organoid_pipeline.image_loader import load_grayscale
+from organoid_pipeline.pipeline import segment_image
+from organoid_pipeline.synthetic import write_organoid
+from organoid_pipeline.tiling import TiledImage
+
+
+def test_reported_threshold_is_the_applied_threshold(tmp_path):
+    image_files = {}
+    for seed in range(2):
+        image_files[f"organoid{seed}"] = str(tmp_path / f"organoid{seed}.tif")
+        write_organoid(image_files[f"organoid{seed}"], size=256, n_cells=6, seed=seed)
+    config = load_config(output_dir=str(tmp_path), workers=1)
+
+    df_thresholds, _ = plate_thresholds(image_files, config)
+    for image_name, reported in zip(df_thresholds["Image Title"], df_thresholds["Otsu Threshold"]):
+        image_path = image_files[image_name]
+        thresh, *_ = segment_image(image_path, load_grayscale(image_path, config["projection"]), config)
+        assert thresh == reported
+        with TiledImage(image_path, load_config(tile_size=100, tile_workers=1)) as tiled:
+            assert tiled.otsu_threshold() == reported
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from scipy import ndimage as ndi
+from scipy.spatial import ConvexHull, QhullError
+from organoid_pipeline.hull import hull_points, row_extremes
+
+
+def _random_mask(seed, shape=(90, 130), density=0.5):
+    rng = np.random.default_rng(seed)
+    return ndi.gaussian_filter(rng.random(shape), 2) > density
+
+
+def _tiled_hull_points(mask, tile_size):
+    # Hull points of every tile in image coordinates, merged as `TiledImage.hull_points` merges them
+    points = []
+    for row in range(0, mask.shape[0], tile_size):
+        for col in range(0, mask.shape[1], tile_size):
+            tile_points = hull_points(mask[row:row + tile_size, col:col + tile_size])
+            points.append(tile_points + (row, col))
+    return row_extremes(np.concatenate(points))
+
+
+def _masks():
+    masks = [_random_mask(seed) for seed in range(5)]
+    masks.append(_random_mask(5, density=0.6))                      # sparse, scattered cells
+    border = np.zeros((40, 50), dtype=bool)
+    border[0, 10:30] = border[:, 0] = border[-1, -5:] = border[20:25, -1] = True
+    masks.append(border)                                            # every edge of the frame
+    single_row = np.zeros((10, 20), dtype=bool)
+    single_row[4, 3:15] = single_row[5, 8] = True
+    masks.append(single_row)                                        # one row plus one pixel below
+    masks.append(np.ones((7, 9), dtype=bool))                       # full frame
+    return masks
+
+
+@pytest.mark.parametrize("mask", _masks())
+def test_hull_area_matches_all_pixels(mask):
+    assert ConvexHull(hull_points(mask)).volume == pytest.approx(ConvexHull(np.argwhere(mask)).volume, rel=1e-12)
+
+
+@pytest.mark.parametrize("mask", _masks())
+def test_hull_points_keep_every_vertex(mask):
+    coords = np.argwhere(mask)
+    vertices = {tuple(point) for point in coords[ConvexHull(coords).vertices]}
+    assert vertices <= {tuple(point) for point in hull_points(mask)}
+
+
+def test_single_row_mask():
+    mask = np.zeros((6, 12), dtype=bool)
+    mask[2, 4:10] = True
+    assert np.array_equal(hull_points(mask), [[2, 4], [2, 9]])
+    # Both inputs are collinear, so neither has a 2D hull
+    for points in (hull_points(mask), np.argwhere(mask)):
+        with pytest.raises(QhullError):
+            ConvexHull(points)
+
+
+def test_empty_mask():
+    assert hull_points(np.zeros((4, 4), dtype=bool)).shape == (0, 2)
+    assert row_extremes(np.empty((0, 2), dtype=np.intp)).shape == (0, 2)
+
+
+@pytest.mark.parametrize("mask", _masks())
+@pytest.mark.parametrize("tile_size", [7, 16, 64])
+def test_row_extremes_merges_tiles(mask, tile_size):
+    merged = _tiled_hull_points(mask, tile_size)
+    assert np.array_equal(merged, hull_points(mask))
+    assert ConvexHull(merged).volume == pytest.approx(ConvexHull(np.argwhere(mask)).volume, rel=1e-12)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from scipy import ndimage as ndi
+from organoid_pipeline.morphology_backends import close_and_dilate
+
+
+def _masks():
+    rng = np.random.default_rng(0)
+    masks = [ndi.gaussian_filter(rng.random((80, 100)), 2) > density for density in (0.5, 0.55, 0.6)]
+    masks.append(rng.random((60, 70)) > 0.9)                # dilation covers the whole frame
+    hole = np.ones((30, 30), dtype=bool)
+    hole[12, 17] = False
+    masks.append(hole)
+    masks.append(np.ones((30, 30), dtype=bool))
+    masks.append(np.zeros((30, 30), dtype=bool))
+    dot = np.zeros((30, 30), dtype=bool)
+    dot[15, 15] = True
+    masks.append(dot)
+    return masks
+
+
+@pytest.mark.parametrize("mask", _masks())
+@pytest.mark.parametrize("radii", [(10, 3), (4, 1)])
+def test_edt_backend_matches_skimage(mask, radii):
+    expected = close_and_dilate(mask, *radii, backend="skimage")
+    assert np.array_equal(close_and_dilate(mask, *radii, backend="edt"), expected)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+import tifffile
+from skimage import draw
+from organoid_pipeline.config import load_config
+from organoid_pipeline.pipeline import process_image
+
+
+@pytest.mark.parametrize("feature_mode", ["per_region", "batched"])
+def test_cells_take_the_largest_min_cell_area_they_pass(tmp_path, feature_mode):
+    # A large and a small elongated cell, and a speck below every threshold
+    image = np.full((240, 240), 20, dtype=np.uint16)
+    image[draw.ellipse(70, 120, 12, 30, image.shape)] = 200
+    image[draw.ellipse(170, 70, 6, 12, image.shape)] = 200
+    image[draw.disk((180, 190), 2, shape=image.shape)] = 200
+    image_path = str(tmp_path / "cells.tif")
+    tifffile.imwrite(image_path, image)
+
+    config = load_config(mode="classify", min_cell_areas=[100, 500, 5000], eccentricity_threshold=0.4,
+                         feature_mode=feature_mode)
+    cell_data_list, _, _ = process_image("cells", image_path, config)
+
+    # The large cell passes both 100 and 500 but is recorded once, under 500
+    assert len(cell_data_list) == 2
+    cells = sorted(cell_data_list, key=lambda cell: cell["Total Area"], reverse=True)
+    assert [cell["Min Cell Area Threshold"] for cell in cells] == [500, 100]
+    assert [cell["Cell ID"] for cell in cell_data_list] == [1, 2]
@@ -0,0 +1,30 @@
+import numpy as np
+import tifffile
+from organoid_pipeline.config import load_config
+from organoid_pipeline.preview import preview_image
+from organoid_pipeline.synthetic import write_organoid
+
+
+def test_noise_image_stops_before_segmentation(tmp_path):
+    # Otsu splits pure noise about evenly, so the foreground fraction alone does not catch it
+    rng = np.random.default_rng(0)
+    noise = np.clip(rng.normal(100, 5, (512, 512)), 0, None).astype(np.uint16)
+    image_path = str(tmp_path / "noise.tif")
+    tifffile.imwrite(image_path, noise)
+
+    summary = preview_image("noise", image_path, load_config(mode="classify"))
+    assert summary["Foreground Fraction"] > 0.3
+    assert summary["Contrast"] < load_config()["preview_min_contrast"]
+    assert summary["Reason"] == "no contrast"
+    assert summary["Apical-out Count"] == summary["Apical-in Count"] == 0
+    assert not summary["Needs Full Resolution"]
+
+
+def test_organoid_passes_contrast_gate(tmp_path):
+    image_path = str(tmp_path / "organoid.tif")
+    truth = write_organoid(image_path, size=512, n_cells=20, seed=1)
+
+    summary = preview_image("organoid", image_path, load_config(mode="classify"))
+    assert summary["Contrast"] >= load_config()["preview_min_contrast"]
+    assert summary["Reason"] != "no contrast"
+    assert summary["Apical-out Count"] + summary["Apical-in Count"] == len(truth["cells"])
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from organoid_pipeline.config import load_config
+from organoid_pipeline.pipeline import process_image
+from organoid_pipeline.synthetic import write_organoid
+
+SIZE = 400
+TILE_SIZES = (128, 200)
+
+
+@pytest.fixture(scope="module")
+def organoid(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("tiling") / "organoid.tif")
+    truth = write_organoid(path, size=SIZE, n_cells=20, seed=3)
+    return path, truth
+
+
+def _straddles(cell, tile_size):
+    # Cell whose bounding circle crosses a tile border along either axis
+    borders = np.arange(tile_size, SIZE, tile_size)
+    radius = cell["Semi-major Axis"]
+    return any(np.any(np.abs(borders - cell[axis]) < radius) for axis in ("Row", "Column"))
+
+
+def _frames(image_path, **settings):
+    cell_data_list, convex_hull_summary, _ = process_image("organoid", image_path, load_config(**settings))
+    cells = pd.DataFrame(cell_data_list).sort_values(["Total Area", "Mean Intensity Ratio"], ignore_index=True)
+    return cells, pd.DataFrame([convex_hull_summary])
+
+
+@pytest.mark.parametrize("mode", ["classify", "count"])
+@pytest.mark.parametrize("tile_size", TILE_SIZES)
+def test_tiled_matches_whole_image(organoid, mode, tile_size):
+    image_path, truth = organoid
+    assert any(_straddles(cell, tile_size) for cell in truth["cells"])
+
+    settings = {"mode": mode, "feature_mode": "batched", "render_overlays": False}
+    expected_cells, expected_hull = _frames(image_path, **settings)
+    cells, hull = _frames(image_path, tile_size=tile_size, tile_workers=1, **settings)
+
+    assert len(expected_cells) > 0
+    pd.testing.assert_frame_equal(cells.drop(columns="Cell ID"), expected_cells.drop(columns="Cell ID"))
+    pd.testing.assert_frame_equal(hull, expected_hull)